@@ -1,3 +1,4 @@
+import asyncio
 import unittest
 import genetic
 import operator
@@ -15,6 +16,50 @@ from datetime import datetime as dt
 class CardTests(unittest.TestCase):
 
 	def test(self):
+		self.solve()
+
+	# swaps that undo earlier swaps bring back hands that were already scored
+	def test_cached(self):
+		fitnessCache = genetic.FitnessCache(1000)
+		self.solve(fitnessCache, seed = 6)
+		print(fitnessCache)
+		self.assertGreater(fitnessCache.Hits, 0)
+
+	def test_fitness_cache(self):
+		fitnessCache = genetic.FitnessCache(3)
+		for genes in [[1], [2], [3]]:
+			fitnessCache.add(genes, genes[0] * 10)
+		self.assertEqual(fitnessCache.lookup([1]), 10) # now the most recently used
+		fitnessCache.add([4], 40) # evicts [2], the least recently used
+		self.assertIsNone(fitnessCache.lookup([2]))
+		fitnessCache.add([5], 50) # evicts [3]
+		self.assertIsNone(fitnessCache.lookup([3]))
+		self.assertEqual([fitnessCache.lookup(genes) for genes in [[1], [4], [5]]], [10, 40, 50])
+		self.assertEqual((fitnessCache.Hits, fitnessCache.Misses), (4, 2))
+
+	def test_async(self):
+		async def solve_all():
+			return await asyncio.gather(*[self.solve_async() for _ in range(5)])
+
+		for best in asyncio.run(solve_all()):
+			self.assertTrue(not Fitness(36, 360, 0) > best.Fitness)
+
+	async def solve_async(self):
+		geneset = [i + 1 for i in range(10)]
+		startTime = dt.now()
+
+		def fnDisplay(candidate):
+			display(candidate, startTime)
+
+		def fnMutate(genes):
+			mutate(genes, geneset)
+
+		optimalFitness = Fitness(36, 360, 0)
+		return await genetic.get_best_async(get_fitness, 10, optimalFitness, geneset, fnDisplay,
+											yieldInterval = 10, custom_mutate = fnMutate)
+
+	def solve(self, fitnessCache = None, seed = None):
+		rng = genetic.get_random(seed)
 		geneset = [i + 1 for i in range(10)] #Ace, 2 - 10
 		startTime = dt.now()
 
@@ -25,10 +70,11 @@ class CardTests(unittest.TestCase):
 			return get_fitness(genes)
 
 		def fnMutate(genes):
-			mutate(genes, geneset)
+			mutate(genes, geneset, rng)
 
 		optimalFitness = Fitness(36, 360, 0)
-		best = genetic.get_best(fnGetFitness, 10, optimalFitness, geneset, fnDisplay, custom_mutate = fnMutate)
+		best = genetic.get_best(fnGetFitness, 10, optimalFitness, geneset, fnDisplay, custom_mutate = fnMutate,
+								fitnessCache = fitnessCache, seed = rng)
 
 		self.assertTrue(not optimalFitness > best.Fitness)
 
@@ -39,11 +85,8 @@ def get_fitness(genes):
 	duplicateCount = len(genes) - len(set(genes)) # Count the number of duplicates -> set() will not contain duplicates
 	return Fitness(group1Sum, group2Prod, duplicateCount)
 
-class Fitness:
-	Group1Sum = None
-	Group2Prod = None
-	TotalDifference = None
-	DuplicateCount = None
+class Fitness(genetic.FitnessValue):
+	__slots__ = ('Group1Sum', 'Group2Prod', 'TotalDifference', 'DuplicateCount')
 
 	def __init__(self, group1Sum, group2Prod, duplicateCount):
 		self.Group1Sum = group1Sum
@@ -70,14 +113,14 @@ def display(candidate, startTime):
 		str(timeDiff)
 		))
 
-def mutate(genes, geneset):
+def mutate(genes, geneset, rng = random):
 	if len(genes) == len(set(genes)): # If there are no duplicates, swap genes a random number of times
-		count = random.randint(1, 5)
+		count = rng.randint(1, 5)
 		while count > 0:
 			count -= 1
-			indexA, indexB = random.sample(range(len(genes)), 2)
+			indexA, indexB = rng.sample(range(len(genes)), 2)
 			genes[indexA], genes[indexB] = genes[indexB], genes[indexA]
 	else: # Change 1 random gene if there are duplicates
-		indexA = random.randrange(0, len(genes))
-		indexB = random.randrange(0, len(geneset))
+		indexA = rng.randrange(0, len(genes))
+		indexB = rng.randrange(0, len(geneset))
 		genes[indexA] = geneset[indexB]
\ No newline at end of file
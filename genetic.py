@@ -1,121 +1,801 @@
-import sys
+import os
+import json
 import time
+import queue
+import asyncio
+import pickle
 import random
 import statistics
+import threading
+import traceback
+import contextlib
+import multiprocessing
 
 from enum import Enum
 from math import exp
+from heapq import heappush, heappop
 from bisect import bisect_left
+from collections import deque, OrderedDict
 
 class Benchmark:
+	# Time function() iterations times (or until maxSeconds of benchmarking have passed) after
+	# warmUp untimed runs. With a seed, run i starts from random.seed(seed + i) so two benchmarks
+	# see the same problems. Output of function() is discarded. The result is written to output
+	# as JSON, and compared to the result saved in baseline when that file exists.
 	@staticmethod
-	def run(function):
+	def run(function, iterations = 100, warmUp = 1, maxSeconds = None, seed = None,
+			output = None, baseline = None, tolerance = 0.1):
+		global _runCounter
 		timings = []
-		stdout = sys.stdout
-		for i in range(100):
-			sys.stdout = None
-			startTime = time.time()
-			function()
-			seconds = time.time() - startTime
-			sys.stdout = stdout
-			timings.append(seconds)
-			mean = statistics.mean(timings)
-			if i == 1:
-				print(f'Benchmarking\n')
-			if i % 10 == 9:
-				print(f'{1 + i} {mean:3.2f} {statistics.stdev(timings, mean):3.2f}')
+		generations = []
+		evaluations = []
+		startTime = time.perf_counter()
+		with open(os.devnull, 'w') as devnull:
+			for i in range(warmUp + iterations):
+				if seed is not None:
+					random.seed(seed + i)
+				_runCounter = _RunCounter()
+				try:
+					with contextlib.redirect_stdout(devnull):
+						runStartTime = time.perf_counter()
+						function()
+						seconds = time.perf_counter() - runStartTime
+				finally:
+					counter, _runCounter = _runCounter, None
+				if i < warmUp:
+					continue
+				timings.append(seconds)
+				generations.append(counter.Generations)
+				evaluations.append(counter.Evaluations)
+				if len(timings) == 2:
+					print(f'Benchmarking\n')
+				if len(timings) % 10 == 0:
+					mean = statistics.mean(timings)
+					print(f'{len(timings)} {mean:3.2f} {statistics.stdev(timings, mean):3.2f}')
+				if maxSeconds is not None and time.perf_counter() - startTime > maxSeconds:
+					break
 
+		result = BenchmarkResult(timings, generations, evaluations)
+		print(result)
+		if baseline is not None and os.path.exists(baseline):
+			result.compare(BenchmarkResult.load(baseline), tolerance)
+		if output is not None:
+			result.save(output)
+		return result
+
+class BenchmarkResult:
+	Timings = None
+	Generations = None
+	Evaluations = None
+	Regressed = False
+
+	def __init__(self, timings, generations, evaluations):
+		self.Timings = timings
+		self.Generations = generations
+		self.Evaluations = evaluations
+
+	@property
+	def Median(self):
+		return statistics.median(self.Timings)
+
+	@property
+	def P95(self):
+		if len(self.Timings) < 2:
+			return self.Timings[0]
+		return statistics.quantiles(self.Timings, n = 20, method = 'inclusive')[-1]
+
+	@property
+	def Min(self):
+		return min(self.Timings)
+
+	@property
+	def GenerationsToSolution(self):
+		return statistics.median(self.Generations)
+
+	@property
+	def EvaluationsPerSecond(self):
+		seconds = sum(self.Timings)
+		return sum(self.Evaluations) / seconds if seconds > 0 else 0
+
+	# Flag a regression when the median run is more than tolerance slower than the baseline's
+	def compare(self, baseline, tolerance = 0.1):
+		ratio = self.Median / baseline.Median
+		self.Regressed = ratio > 1 + tolerance
+		print(f'{ratio:3.2f}x baseline median {baseline.Median:3.4f}s' + (' - REGRESSION' if self.Regressed else ''))
+		return ratio
+
+	def save(self, path):
+		with open(path, mode = 'w') as outfile:
+			json.dump({
+				'median': self.Median, 'p95': self.P95, 'min': self.Min,
+				'generationsToSolution': self.GenerationsToSolution,
+				'evaluationsPerSecond': self.EvaluationsPerSecond,
+				'timings': self.Timings, 'generations': self.Generations, 'evaluations': self.Evaluations
+			}, outfile, indent = 2)
+
+	@staticmethod
+	def load(path):
+		with open(path, mode = 'r') as infile:
+			data = json.load(infile)
+		return BenchmarkResult(data['timings'], data['generations'], data['evaluations'])
+
+	def __str__(self):
+		return f'{len(self.Timings)} runs: median {self.Median:3.4f}s p95 {self.P95:3.4f}s min {self.Min:3.4f}s ' \
+			f'{self.GenerationsToSolution:.0f} generations {self.EvaluationsPerSecond:.0f} evaluations/s'
+
+# Counts for the run being benchmarked, None otherwise so that get_best adds no overhead.
+# Fitness evaluated in worker processes is not counted.
+_runCounter = None
+
+class _RunCounter:
+	Generations = 0
+	Evaluations = 0
+
+	def count_evaluations(self, get_fitness):
+		def fnGetFitness(*args):
+			self.Evaluations += 1
+			return get_fitness(*args)
+		return fnGetFitness
+
+	def count_batch_evaluations(self, get_fitness_batch):
+		def fnGetFitnessBatch(genesMatrix):
+			self.Evaluations += len(genesMatrix)
+			return get_fitness_batch(genesMatrix)
+		return fnGetFitnessBatch
+
+	def count_generations(self, new_child):
+		def fnNewChild(parent, index, parents):
+			self.Generations += 1
+			return new_child(parent, index, parents)
+		return fnNewChild
+
+# Ends a search when it runs out of wall-clock seconds, fitness evaluations or generations, or has
+# gone maxStallGenerations generations / maxStallSeconds seconds without improving. _get_improvement
+# only counts a local down to zero and then calls check(), which returns the next countdown (0 once
+# the budget is spent). The countdown doubles up to clockInterval while checks are less than a
+# millisecond apart and halves when they are more than 10ms apart, so cheap fitnesses don't read the
+# clock every generation and slow ones don't overrun maxSeconds. It never skips past a generation
+# limit; evaluations (which include the initial pool) can overrun by a generation's worth.
+class _Budget(_RunCounter):
+	def __init__(self, maxSeconds = None, maxEvaluations = None, maxGenerations = None,
+				maxStallGenerations = None, maxStallSeconds = None, clockInterval = 1024):
+		self._maxSeconds = maxSeconds
+		self._maxEvaluations = maxEvaluations
+		self._maxGenerations = maxGenerations
+		self._maxStallGenerations = maxStallGenerations
+		self._maxStallSeconds = maxStallSeconds
+		self._clockInterval = clockInterval
+		self._interval = 0 # generations counted down since the last check
+		self._startTime = self._lastCheck = self._lastImprovementTime = time.time()
+		self._lastImprovementGeneration = 0
+
+	@staticmethod
+	def create(maxSeconds = None, maxEvaluations = None, maxGenerations = None, maxStallGenerations = None,
+				maxStallSeconds = None, clockInterval = 1024):
+		if maxSeconds is None and maxEvaluations is None and maxGenerations is None and \
+				maxStallGenerations is None and maxStallSeconds is None:
+			return None
+		return _Budget(maxSeconds, maxEvaluations, maxGenerations, maxStallGenerations, maxStallSeconds,
+						clockInterval)
+
+	@property
+	def CountsEvaluations(self):
+		return self._maxEvaluations is not None
+
+	def spent(self, now = None):
+		if now is None:
+			now = time.time()
+		return (self._maxSeconds is not None and now - self._startTime > self._maxSeconds) or \
+			(self._maxStallSeconds is not None and now - self._lastImprovementTime > self._maxStallSeconds) or \
+			(self._maxEvaluations is not None and self.Evaluations >= self._maxEvaluations) or \
+			(self._maxGenerations is not None and self.Generations >= self._maxGenerations) or \
+			(self._maxStallGenerations is not None and
+				self.Generations - self._lastImprovementGeneration >= self._maxStallGenerations)
+
+	# called when the countdown reaches zero
+	def check(self):
+		self.Generations += self._interval
+		now = time.time()
+		if self.spent(now):
+			return 0
+		if now - self._lastCheck < 0.001:
+			interval = min(max(1, self._interval * 2), self._clockInterval)
+		elif now - self._lastCheck > 0.01:
+			interval = max(1, self._interval // 2)
+		else:
+			interval = max(1, self._interval)
+		self._lastCheck = now
+		if self._maxGenerations is not None:
+			interval = min(interval, self._maxGenerations - self.Generations)
+		if self._maxEvaluations is not None:
+			interval = min(interval, max(1, self._maxEvaluations - self.Evaluations))
+		if self._maxStallGenerations is not None:
+			interval = min(interval, self._lastImprovementGeneration + self._maxStallGenerations - self.Generations)
+		self._interval = interval
+		return interval
+
+	# countdown is the value of the local countdown when the improvement was made
+	def improved(self, countdown):
+		self.Generations += self._interval - countdown
+		self._interval = countdown
+		self._lastImprovementGeneration = self.Generations
+		self._lastImprovementTime = time.time()
+
+# Slotted, as a run allocates one per child
 class Chromosome:
-	Genes = None
-	Fitness = None
-	Age = 0 # Track how many generations passed since last improvement
-	Strategy = None
+	__slots__ = ('Genes', 'Fitness', 'Age', 'Strategy')
 
 	def __init__(self, genes, fitness, strategy):
 		self.Genes = genes
 		self.Fitness = fitness
+		self.Age = 0 # Track how many generations passed since last improvement
 		self.Strategy = strategy
 
+# Base for fitness types that only define __gt__. It fills in the other orderings so that sorting,
+# bisect, min and max work on them directly, and has empty __slots__ so that subclasses declaring
+# their own __slots__ carry no per-instance __dict__. Equality is left as identity.
+class FitnessValue:
+	__slots__ = ()
+
+	def __lt__(self, other):
+		return other.__gt__(self)
+
+	def __le__(self, other):
+		return not self.__gt__(other)
+
+	def __ge__(self, other):
+		return not other.__gt__(self)
+
+# Bounded least-recently-used memo of fitness by genes. Pass one to get_best as fitnessCache and
+# read Hits and Misses afterwards. key must turn the genes into something hashable.
+class FitnessCache:
+	MaxSize = None
+	Hits = 0
+	Misses = 0
+
+	def __init__(self, maxSize = 10000, key = tuple):
+		self.MaxSize = maxSize
+		self._key = key
+		self._fitnesses = OrderedDict()
+
+	def lookup(self, genes):
+		key = self._key(genes)
+		fitness = self._fitnesses.get(key)
+		if fitness is None:
+			self.Misses += 1
+			return None
+		self._fitnesses.move_to_end(key)
+		self.Hits += 1
+		return fitness
+
+	def add(self, genes, fitness):
+		self._fitnesses[self._key(genes)] = fitness
+		if len(self._fitnesses) > self.MaxSize:
+			self._fitnesses.popitem(last = False)
+
+	def wrap(self, get_fitness):
+		def fnGetFitness(genes):
+			fitness = self.lookup(genes)
+			if fitness is None:
+				fitness = get_fitness(genes)
+				self.add(genes, fitness)
+			return fitness
+		return fnGetFitness
+
+	def __str__(self):
+		lookups = self.Hits + self.Misses
+		return f'{self.Hits} hits, {self.Misses} misses ({self.Hits / lookups if lookups > 0 else 0:.1%} hit rate)'
+
+# Pass one to get_best to find out where a run spends its time: children and improvements per
+# Strategy, annealing decisions, and seconds and calls spent in each user callback. Diversity of
+# the parents pool is measured every sampleInterval generations. With a sampleFile, a JSON line
+# with the counters so far is appended every sampleInterval generations.
+# Callbacks run in worker processes are timed as a whole under 'worker_batch'.
+class Instrumentation:
+	Generations = 0
+	Improvements = 0
+	AgeResets = 0 # aged parent replaced by the best parent
+	AnnealingAcceptances = 0 # aged parent replaced by a worse child
+	Children = None # per Strategy
+	StrategyImprovements = None # per Strategy
+	CallbackSeconds = None # per callback name
+	CallbackCalls = None # per callback name
+	Diversity = None # of the parents pool when last measured
+	Seconds = 0
+
+	def __init__(self, sampleFile = None, sampleInterval = 10000):
+		self.Children = {s: 0 for s in Strategies}
+		self.StrategyImprovements = {s: 0 for s in Strategies}
+		self.CallbackSeconds = {}
+		self.CallbackCalls = {}
+		self._sampleFile = sampleFile
+		self._sampleInterval = sampleInterval
+		self._samples = None
+		self._startTime = None
+
+	def timed(self, name, function):
+		if function is None:
+			return None
+		seconds = self.CallbackSeconds
+		calls = self.CallbackCalls
+		seconds[name] = seconds.get(name, 0.0)
+		calls[name] = calls.get(name, 0)
+		timer = time.perf_counter
+
+		def fnTimed(*args):
+			startTime = timer()
+			result = function(*args)
+			seconds[name] += timer() - startTime
+			calls[name] += 1
+			return result
+
+		return fnTimed
+
+	def counting(self, new_child):
+		children = self.Children
+
+		def fnNewChild(parent, index, parents):
+			child = new_child(parent, index, parents)
+			self.Generations += 1
+			children[child.Strategy] += 1
+			if self.Generations % self._sampleInterval == 0:
+				self.Diversity = measure_diversity(parents)
+				if self._samples is not None:
+					self.sample()
+			return child
+
+		return fnNewChild
+
+	def improved(self, improvement):
+		self.Improvements += 1
+		self.StrategyImprovements[improvement.Strategy] += 1
+
+	def start(self):
+		self._startTime = time.perf_counter()
+		if self._sampleFile is not None:
+			self._samples = open(self._sampleFile, mode = 'a')
+
+	def stop(self):
+		self.Seconds = time.perf_counter() - self._startTime
+		if self._samples is not None:
+			self.sample()
+			self._samples.close()
+			self._samples = None
+
+	def sample(self):
+		self._samples.write(json.dumps({
+			'seconds': time.perf_counter() - self._startTime,
+			'generations': self.Generations,
+			'improvements': self.Improvements,
+			'ageResets': self.AgeResets,
+			'annealingAcceptances': self.AnnealingAcceptances,
+			'children': {s.name: n for s, n in self.Children.items()},
+			'uniqueGenomes': self.Diversity.UniqueGenomes if self.Diversity is not None else None,
+			'meanHammingDistance': self.Diversity.MeanHammingDistance if self.Diversity is not None else None,
+			'callbackSeconds': self.CallbackSeconds
+		}) + '\n')
+
+	@property
+	def ImprovementsPerSecond(self):
+		return self.Improvements / self.Seconds if self.Seconds > 0 else 0
+
+	def __str__(self):
+		lines = [f'{self.Generations} generations, {self.Improvements} improvements ({self.ImprovementsPerSecond:.1f}/s), '
+				f'{self.AgeResets} age resets, {self.AnnealingAcceptances} annealing acceptances']
+		for strategy in Strategies:
+			lines.append(f'{strategy.name}: {self.Children[strategy]} children, {self.StrategyImprovements[strategy]} improvements')
+		if self.Diversity is not None:
+			lines.append(str(self.Diversity))
+		for name, seconds in self.CallbackSeconds.items():
+			lines.append(f'{name}: {self.CallbackCalls[name]} calls, {seconds:.4f}s')
+		return '\n'.join(lines)
+
 class Strategies(Enum):
 	Create = 0,
 	Mutate = 1,
 	Crossover = 2
 
+class AnnealingSchedule(Enum):
+	Exponential = 0 # accept with probability e^-s
+	Linear = 1 # accept with probability 1 - s
+	Temperature = 2 # accept with probability e^(-s/T), T is multiplied by cooling after every decision
+
+# Decides whether a parent that has aged out is replaced by its worse child, or by the best parent.
+# s is the share of the best fitnesses found so far (History, in improving order) that are at least
+# as good as the child, found by bisecting History, so children that would have ranked well are
+# accepted more often. History is halved (keeping every other fitness and the latest) whenever it
+# grows past maxHistory, so long runs use bounded memory. Pass one to get_best as annealing.
+class Annealing:
+	Schedule = AnnealingSchedule.Exponential
+	MaxHistory = 1000
+	Temperature = 1.0
+	Cooling = 0.999
+	History = None
+
+	def __init__(self, schedule = AnnealingSchedule.Exponential, maxHistory = 1000, temperature = 1.0,
+				cooling = 0.999):
+		self.Schedule = schedule
+		self.MaxHistory = maxHistory
+		self.Temperature = temperature
+		self.Cooling = cooling
+		self._temperature = temperature
+
+	# called by the engine at the start of each run, history is changed in place
+	def start(self, history):
+		self.History = history
+		self._temperature = self.Temperature
+
+	def improved(self, fitness):
+		history = self.History
+		history.append(fitness)
+		if len(history) > self.MaxHistory:
+			history[:] = history[(len(history) - 1) % 2::2]
+
+	def accept(self, fitness, rng = random):
+		history = self.History
+		proportionSimilar = (len(history) - bisect_left(history, fitness)) / len(history)
+		if self.Schedule == AnnealingSchedule.Linear:
+			return rng.random() < 1 - proportionSimilar
+		if self.Schedule == AnnealingSchedule.Temperature:
+			temperature = self._temperature
+			self._temperature *= self.Cooling
+			return rng.random() < (exp(-proportionSimilar / temperature) if temperature > 0 else 0)
+		return rng.random() < exp(-proportionSimilar)
+
+class Diversity:
+	PoolSize = 0
+	UniqueGenomes = 0
+	MeanHammingDistance = 0 # over a sample of pairs of parents, genes beyond the shorter one differ
+
+	def __init__(self, poolSize, uniqueGenomes, meanHammingDistance):
+		self.PoolSize = poolSize
+		self.UniqueGenomes = uniqueGenomes
+		self.MeanHammingDistance = meanHammingDistance
+
+	def __str__(self):
+		return f'{self.UniqueGenomes}/{self.PoolSize} unique genomes, mean Hamming distance {self.MeanHammingDistance:.1f}'
+
+# Diversity of a parents pool. Up to samplePairs pairs are compared (all of them for small pools),
+# always the same ones for a given pool size so that measurements during a run are comparable.
+def measure_diversity(parents, samplePairs = 100, key = tuple):
+	size = len(parents)
+	uniqueGenomes = len({key(p.Genes) for p in parents})
+	if size < 2:
+		return Diversity(size, uniqueGenomes, 0)
+	if size * (size - 1) // 2 <= samplePairs:
+		pairs = [(i, j) for i in range(size) for j in range(i + 1, size)]
+	else:
+		sampler = random.Random(size)
+		pairs = [sampler.sample(range(size), 2) for _ in range(samplePairs)]
+	total = 0
+	for i, j in pairs:
+		genesA, genesB = parents[i].Genes, parents[j].Genes
+		total += sum(1 for a, b in zip(genesA, genesB) if a != b) + abs(len(genesA) - len(genesB))
+	return Diversity(size, uniqueGenomes, total / len(pairs))
+
+# Parents pool that refuses duplicate genomes: it counts the key of every member, kept per slot
+# because a member's genes may be changed in place after it was added.
+class _UniquePool(list):
+	def __init__(self, chromosomes, key = tuple):
+		super().__init__(chromosomes)
+		self._key = key
+		self._keys = [key(c.Genes) for c in chromosomes]
+		self._counts = {}
+		for k in self._keys:
+			self._counts[k] = self._counts.get(k, 0) + 1
+
+	def __setitem__(self, index, chromosome):
+		if self[index] is chromosome:
+			return
+		oldKey = self._keys[index]
+		count = self._counts[oldKey] - 1
+		if count == 0:
+			del self._counts[oldKey]
+		else:
+			self._counts[oldKey] = count
+		newKey = self._key(chromosome.Genes)
+		self._counts[newKey] = self._counts.get(newKey, 0) + 1
+		self._keys[index] = newKey
+		super().__setitem__(index, chromosome)
+
+	# whether a member other than the one at index has these genes
+	def has_other(self, genes, index):
+		k = self._key(genes)
+		count = self._counts.get(k, 0)
+		if self._keys[index] == k:
+			count -= 1
+		return count > 0
+
+# Orders the unique genomes first, so that taking the first count keeps duplicates out when possible
+def _unique_first(candidates, key = tuple):
+	seen = set()
+	unique = []
+	duplicates = []
+	for chromosome in candidates:
+		k = key(chromosome.Genes)
+		if k in seen:
+			duplicates.append(chromosome)
+		else:
+			seen.add(k)
+			unique.append(chromosome)
+	return unique + duplicates
+
+# Picks the Strategy for each child by probability matching: each strategy's Quality is an
+# exponentially decaying average (rate adaptationRate) of whether its children beat their parent,
+# and it is picked in proportion to its Quality, but never less often than minProbability. The pick
+# probabilities are refreshed every refreshInterval updates, which keeps update cheap. get_best
+# uses one when there is a crossover; pass your own as strategySelector to tune it or to read
+# SuccessRates and Probabilities afterwards.
+class StrategySelector:
+	Quality = None
+	Trials = None
+	Successes = None
+
+	def __init__(self, adaptationRate = 0.05, minProbability = 0.05, refreshInterval = 16):
+		self._adaptationRate = adaptationRate
+		self._minProbability = minProbability
+		self._refreshInterval = refreshInterval
+		self._strategies = None
+		self._cumulative = None
+		self._refreshCountdown = refreshInterval
+
+	# called by the engine at the start of each run
+	def start(self, strategies):
+		self._strategies = list(strategies)
+		self.Quality = {strategy: 1.0 for strategy in self._strategies}
+		self.Trials = {strategy: 0 for strategy in self._strategies}
+		self.Successes = {strategy: 0 for strategy in self._strategies}
+		self._refresh()
+
+	def _refresh(self):
+		self._refreshCountdown = self._refreshInterval
+		total = sum(self.Quality.values())
+		share = 1 - len(self._strategies) * self._minProbability
+		cumulative = []
+		running = 0
+		for strategy in self._strategies:
+			running += self._minProbability + share * (self.Quality[strategy] / total if total > 0
+														else 1 / len(self._strategies))
+			cumulative.append(running)
+		self._cumulative = cumulative
+
+	def select(self, rng = random):
+		value = rng.random() * self._cumulative[-1]
+		for strategy, cumulative in zip(self._strategies, self._cumulative):
+			if value < cumulative:
+				return strategy
+		return self._strategies[-1]
+
+	def update(self, strategy, succeeded):
+		quality = self.Quality.get(strategy)
+		if quality is None:
+			return
+		self.Trials[strategy] += 1
+		if succeeded:
+			self.Successes[strategy] += 1
+			self.Quality[strategy] = quality + self._adaptationRate * (1 - quality)
+		else:
+			self.Quality[strategy] = quality - self._adaptationRate * quality
+		self._refreshCountdown -= 1
+		if self._refreshCountdown == 0:
+			self._refresh()
+
+	@property
+	def SuccessRates(self):
+		return {strategy: self.Successes[strategy] / self.Trials[strategy] if self.Trials[strategy] > 0 else 0
+				for strategy in self._strategies}
+
+	@property
+	def Probabilities(self):
+		previous = 0
+		probabilities = {}
+		for strategy, cumulative in zip(self._strategies, self._cumulative):
+			probabilities[strategy] = (cumulative - previous) / self._cumulative[-1]
+			previous = cumulative
+		return probabilities
+
+	def getstate(self):
+		return {strategy.name: (self.Quality[strategy], self.Trials[strategy], self.Successes[strategy])
+				for strategy in self._strategies}
+
+	def setstate(self, state):
+		for name, (quality, trials, successes) in state.items():
+			strategy = Strategies[name]
+			if strategy in self.Quality:
+				self.Quality[strategy], self.Trials[strategy], self.Successes[strategy] = quality, trials, successes
+		self._refresh()
+
+	def __str__(self):
+		probabilities = self.Probabilities
+		successRates = self.SuccessRates
+		return '\n'.join(f'{strategy.name}: {self.Trials[strategy]} children, {successRates[strategy]:.3f} succeeded, '
+						f'picked {probabilities[strategy]:.3f}' for strategy in self._strategies)
+
 # _ indicates protected function
-def _generate_parent(length, geneSet, get_fitness):
+def _generate_parent(length, geneSet, get_fitness, rng = random):
 	genes = []
 	while len(genes) < length:
 		sampleSize = min(length - len(genes), len(geneSet))
-		genes.extend(random.sample(geneSet, sampleSize))
+		genes.extend(rng.sample(geneSet, sampleSize))
 	fitness = get_fitness(genes)
 	return Chromosome(genes, fitness, Strategies.Create)
 
-def _mutate(parent, geneSet, get_fitness):
+def _mutate(parent, geneSet, get_fitness, fitness_delta = None, rng = random):
 	childGenes = parent.Genes[:]
-	index = random.randrange(0, len(parent.Genes))
-	newGene, alternate = random.sample(geneSet, 2)
+	index = rng.randrange(0, len(parent.Genes))
+	newGene, alternate = rng.sample(geneSet, 2)
 	childGenes[index] = alternate \
 		if newGene == childGenes[index] \
 		else newGene
-	fitness = get_fitness(childGenes)
+	fitness = _get_child_fitness(parent, [index], childGenes, get_fitness, fitness_delta)
 	return Chromosome(childGenes, fitness, Strategies.Mutate)
 
-def _mutate_custom(parent, custom_mutate, get_fitness):
+# Like _mutate, but changes the parent's own genes and records the old value in undoLog
+# instead of copying them. The child shares the parent's genes list.
+def _mutate_in_place(parent, geneSet, get_fitness, undoLog, rng = random):
+	genes = parent.Genes
+	index = rng.randrange(0, len(genes))
+	newGene, alternate = rng.sample(geneSet, 2)
+	undoLog.start(genes)
+	undoLog.record(index)
+	genes[index] = alternate \
+		if newGene == genes[index] \
+		else newGene
+	fitness = get_fitness(genes)
+	return Chromosome(genes, fitness, Strategies.Mutate)
+
+# Old values of the genes changed by the last in-place mutation
+class _UndoLog:
+	__slots__ = ('_genes', '_changes')
+
+	def __init__(self):
+		self._genes = None
+		self._changes = []
+
+	def start(self, genes):
+		self._genes = genes
+		self._changes.clear()
+
+	def record(self, index):
+		self._changes.append((index, self._genes[index]))
+
+	def undo(self):
+		genes = self._genes
+		changes = self._changes
+		for i in range(len(changes) - 1, -1, -1):
+			index, gene = changes[i]
+			genes[index] = gene
+		changes.clear()
+
+# custom_mutate may return the indexes it changed so that fitness_delta can be used
+def _mutate_custom(parent, custom_mutate, get_fitness, fitness_delta = None):
 	childGenes = parent.Genes[:]
-	custom_mutate(childGenes)
-	fitness = get_fitness(childGenes)
+	changedIndexes = custom_mutate(childGenes)
+	fitness = _get_child_fitness(parent, changedIndexes, childGenes, get_fitness, fitness_delta)
 	return Chromosome(childGenes, fitness, Strategies.Mutate)
 
+# Incremental evaluation - fitness_delta(parentGenes, parentFitness, changedIndexes, childGenes) derives
+# the child's fitness from the parent's by looking only at the changed indexes
+def _get_child_fitness(parent, changedIndexes, childGenes, get_fitness, fitness_delta):
+	if fitness_delta is None or changedIndexes is None or parent.Fitness is None:
+		return get_fitness(childGenes)
+	return fitness_delta(parent.Genes, parent.Fitness, changedIndexes, childGenes)
+
 # Generate sucessively better gene squence and send to get_best
 # using yield -> code does not run when function is called! instead it
 # returns a generator object (single use iterable)
-def _get_improvement(new_child, generate_parent, maxAge, poolSize, maxSeconds):
-	startTime = time.time()
-	parent = bestParent = generate_parent() # This refers to the value from the function passed as an arguement
-	yield maxSeconds is not None and time.time() - startTime > maxSeconds, bestParent
-	parents = [bestParent] # For crossover
-	historicalFitnesses = [bestParent.Fitness] # List of fitnesses of the historical best parents
-
-	# populate parents array by generating new random parents, and contunously replace parent with better children
-	for _ in range(poolSize - 1):
-		parent = generate_parent()
-		if maxSeconds is not None and time.time() - startTime > maxSeconds:
-			yield True, parent
-		if parent.Fitness > bestParent.Fitness:
-			yield False, parent
-			bestParent = parent
-			historicalFitnesses.append(parent.Fitness)
-		parents.append(parent)
-	lastParentIndex = poolSize - 1
-	pindex = 1
+# state = (parents, bestParent, historicalFitnesses, pindex) continues an earlier run, see _Checkpoint.
+# checkpoint(parents, bestParent, historicalFitnesses, pindex) is offered the state after the
+# pool is built, on every improvement, every checkpointInterval generations and when the budget
+# runs out.
+# With a yieldInterval, (False, None) is also yielded every yieldInterval generations.
+# budget is a _Budget or None
+# With an undoLog, mutated children share their parent's genes (see _mutate_in_place). A rejected
+# child is undone, a kept one takes the genes over from the parent it replaces, so genes are only
+# copied for each new best and the pool's chromosomes are never the ones yielded.
+# With uniqueParents, a child whose genome is already in the pool does not replace its parent, and
+# an aged parent is replaced by a new random one instead of by a second copy of the best.
+def _get_improvement(new_child, generate_parent, maxAge, poolSize, budget, instrumentation = None, rng = random,
+					checkpoint = None, state = None, checkpointInterval = 1000, yieldInterval = None,
+					strategySelector = None, undoLog = None, uniqueParents = False, annealing = None):
+	if annealing is None:
+		annealing = Annealing()
+	if state is not None:
+		parents, bestParent, historicalFitnesses, pindex = state
+		annealing.start(historicalFitnesses)
+		yield budget is not None and budget.spent(), bestParent
+	else:
+		parent = bestParent = generate_parent() # This refers to the value from the function passed as an arguement
+		yield budget is not None and budget.spent(), bestParent
+		parents = [bestParent] # For crossover
+		historicalFitnesses = [bestParent.Fitness] # List of fitnesses of the historical best parents
+		annealing.start(historicalFitnesses)
+
+		# populate parents array by generating new random parents, and contunously replace parent with better children
+		for _ in range(poolSize - 1):
+			parent = generate_parent()
+			if budget is not None and budget.spent():
+				yield True, parent
+			if parent.Fitness > bestParent.Fitness:
+				yield False, parent
+				bestParent = parent
+				annealing.improved(parent.Fitness)
+			parents.append(parent)
+		pindex = 1
+	if undoLog is not None:
+		parents = [Chromosome(p.Genes[:], p.Fitness, p.Strategy) for p in parents]
+	if uniqueParents:
+		parents = _UniquePool(parents)
+	lastParentIndex = len(parents) - 1
+	if checkpoint is not None:
+		checkpoint(parents, bestParent, historicalFitnesses, pindex)
+		checkpointCountdown = checkpointInterval
+	yieldCountdown = yieldInterval
+	budgetCountdown = 1
 	while True:
-		if maxSeconds is not None and time.time() - startTime > maxSeconds:
-			yield True, bestParent
+		if budget is not None:
+			budgetCountdown -= 1
+			if budgetCountdown == 0:
+				budgetCountdown = budget.check()
+				if budgetCountdown == 0:
+					# so that a resumed run continues from this generation
+					if checkpoint is not None:
+						checkpoint(parents, bestParent, historicalFitnesses, pindex)
+					yield True, bestParent
+		if checkpoint is not None:
+			checkpointCountdown -= 1
+			if checkpointCountdown == 0:
+				checkpointCountdown = checkpointInterval
+				checkpoint(parents, bestParent, historicalFitnesses, pindex)
+		if yieldCountdown is not None:
+			yieldCountdown -= 1
+			if yieldCountdown == 0:
+				yieldCountdown = yieldInterval
+				yield False, None
 		# select a different parent to be the current parent
 		pindex = pindex - 1 if pindex > 0 else lastParentIndex
 		parent = parents[pindex]
 
 		# child = new_child(parent) # This refers to the value from the function passed as an arguement
 		child = new_child(parent, pindex, parents)
+		inPlace = undoLog is not None and child.Genes is parent.Genes
+		if strategySelector is not None:
+			strategySelector.update(child.Strategy, child.Fitness > parent.Fitness)
+		if uniqueParents and not parent.Fitness > child.Fitness and parents.has_other(child.Genes, pindex):
+			if inPlace:
+				undoLog.undo()
+			continue
 		if parent.Fitness > child.Fitness:
 			if maxAge is None:
+				if inPlace:
+					undoLog.undo()
 				continue
 			parent.Age += 1
 			if maxAge > parent.Age:
+				if inPlace:
+					undoLog.undo()
 				continue
 			# Annealing - If child gene sequence is far away from the current best solution, give gene
-			# high probabily of continuing, otherwise do something else (implementation specific)
-			# get index location of the child.Fitness in the historicalFitness
-			index = bisect_left(historicalFitnesses, child.Fitness, 0, len(historicalFitnesses)) 
-			difference = len(historicalFitnesses) - index # Get proximity of best fitness
-			proportionSimilar = difference / len(historicalFitnesses)
-			if random.random() < exp(-proportionSimilar): # e^difference = scaled difference 0 to 1
+			# high probabily of continuing, otherwise do something else (see Annealing)
+			if annealing.accept(child.Fitness, rng) and \
+					not (uniqueParents and parents.has_other(child.Genes, pindex)):
 				# parent = child # child becomes new parent if chance is high
 				parents[pindex] = child #crossover
+				if instrumentation is not None:
+					instrumentation.AnnealingAcceptances += 1
 				continue
 			# parent = bestParent # otherwise replace parent with best parent, reset age to 0 giving time to anneal
-			parents[pindex] = bestParent #crossover
+			if inPlace:
+				undoLog.undo()
+			if uniqueParents and parents.has_other(bestParent.Genes, pindex):
+				parents[pindex] = generate_parent()
+			elif undoLog is None:
+				parents[pindex] = bestParent #crossover
+			else:
+				parents[pindex] = Chromosome(bestParent.Genes[:], bestParent.Fitness, bestParent.Strategy)
 			parent.Age = 0
+			if instrumentation is not None:
+				instrumentation.AgeResets += 1
 			continue
 		if not child.Fitness > parent.Fitness:
 			# same fitness
@@ -128,58 +808,872 @@ def _get_improvement(new_child, generate_parent, maxAge, poolSize, maxSeconds):
 		parent.Age = 0
 		# when find child with fitness better than best parent, replace best parent, and append to historical fitnesses
 		if child.Fitness > bestParent.Fitness:
+			if budget is not None:
+				budget.improved(budgetCountdown)
+			if undoLog is not None:
+				child = Chromosome(child.Genes[:], child.Fitness, child.Strategy)
 			yield False, child
 			bestParent = child
-			historicalFitnesses.append(child.Fitness)
+			annealing.improved(child.Fitness)
+			if checkpoint is not None:
+				checkpoint(parents, bestParent, historicalFitnesses, pindex)
 
 
 
+class Selection(Enum):
+	Tournament = 0 # the best of tournamentSize random individuals
+	Rank = 1 # linear ranking, the best is picked populationSize times as often as the worst
+	Truncation = 2 # uniformly from the best truncation fraction
+
+class Replacement(Enum):
+	Generational = 0 # the elites and the best children make the next generation
+	MuPlusLambda = 1 # the best of the current generation and its children make the next one
+
+# Settings for the generational engine; pass one to get_best as generational. The population is
+# poolSize individuals, and each generation breeds offspring (default poolSize) children from
+# parents picked by selection. elitism is the number of best individuals carried over unchanged
+# under Replacement.Generational; when there are too few children to fill the population, the
+# best of the rest of the current generation make up the difference. Budgets count children,
+# not generations: maxGenerations, maxStallGenerations and yieldInterval are numbers of children,
+# the same unit as one steady-state generation, so a maxGenerations of 100 with offspring 50 ends
+# after two generations.
+class Generational:
+	Selection = Selection.Tournament
+	TournamentSize = 3
+	Truncation = 0.5
+	Elitism = 1
+	Replacement = Replacement.Generational
+	Offspring = None
+
+	def __init__(self, selection = Selection.Tournament, tournamentSize = 3, truncation = 0.5, elitism = 1,
+				replacement = Replacement.Generational, offspring = None):
+		self.Selection = selection
+		self.TournamentSize = tournamentSize
+		self.Truncation = truncation
+		self.Elitism = elitism
+		self.Replacement = replacement
+		self.Offspring = offspring
+
+	# returns a function that picks an index into ranked, which is sorted best first
+	def selector(self, ranked, rng = random):
+		size = len(ranked)
+		if self.Selection == Selection.Tournament:
+			tournamentSize = self.TournamentSize
+
+			def fnSelect():
+				best = rng.randrange(size)
+				for _ in range(tournamentSize - 1):
+					index = rng.randrange(size)
+					if index < best:
+						best = index
+				return best
+		elif self.Selection == Selection.Rank:
+			cumulative = []
+			total = 0
+			for index in range(size):
+				total += size - index
+				cumulative.append(total)
+
+			def fnSelect():
+				return bisect_left(cumulative, rng.random() * total)
+		else:
+			top = max(1, int(size * self.Truncation))
+
+			def fnSelect():
+				return rng.randrange(top)
+		return fnSelect
+
+def _scored(chromosomes):
+	return chromosomes
+
+def _fitness_of(chromosome):
+	return chromosome.Fitness
+
+def _best_of(chromosomes):
+	best = chromosomes[0]
+	for chromosome in chromosomes:
+		if chromosome.Fitness > best.Fitness:
+			best = chromosome
+	return best
+
+# The generational counterpart of _get_improvement. Each generation's children are made first and
+# then scored together by score(children), which returns them with their fitness set (children
+# from a deferring evaluator have none until then). The best child of a generation is yielded when
+# it beats the best so far. state, checkpoint, budget and yieldInterval are as in _get_improvement;
+# maxAge and annealing do not apply.
+def _get_generational_improvement(new_child, generate_parent, score, poolSize, generational, budget,
+								rng = random, checkpoint = None, state = None, yieldInterval = None,
+								strategySelector = None, uniqueParents = False):
+	if state is not None:
+		population, bestParent, historicalFitnesses, _ = state
+	else:
+		population = score([generate_parent() for _ in range(poolSize)])
+		bestParent = _best_of(population)
+		historicalFitnesses = [bestParent.Fitness]
+	yield budget is not None and budget.spent(), bestParent
+	offspring = generational.Offspring if generational.Offspring is not None else poolSize
+	elitism = min(generational.Elitism, poolSize)
+	yieldCountdown = yieldInterval
+	budgetCountdown = 1
+	while True:
+		if checkpoint is not None:
+			checkpoint(population, bestParent, historicalFitnesses, 0)
+		ranked = sorted(population, key = _fitness_of, reverse = True)
+		# _crossover can replace a donor with a new (unscored) individual, which happens in the
+		# children's copy so that ranked stays sorted; the newcomers then compete with the children
+		mates = ranked[:]
+		select = generational.selector(ranked, rng)
+		children = []
+		childParents = []
+		timedOut = False
+		for _ in range(offspring):
+			if budget is not None:
+				budgetCountdown -= 1
+				if budgetCountdown == 0:
+					budgetCountdown = budget.check()
+					if budgetCountdown == 0:
+						timedOut = True
+						break
+			index = select()
+			children.append(new_child(ranked[index], index, mates))
+			childParents.append(ranked[index])
+		newcomers = [mate for mate, parent in zip(mates, ranked) if mate is not parent]
+		score(children + newcomers)
+		if strategySelector is not None:
+			for child, parent in zip(children, childParents):
+				strategySelector.update(child.Strategy, child.Fitness > parent.Fitness)
+		if len(children) > 0:
+			child = _best_of(children)
+			if child.Fitness > bestParent.Fitness:
+				if budget is not None:
+					budget.improved(budgetCountdown)
+				yield False, child
+				bestParent = child
+				historicalFitnesses.append(child.Fitness)
+		if timedOut:
+			yield True, bestParent
+		if generational.Replacement == Replacement.MuPlusLambda:
+			# children first, so that on a plateau they win ties and the population can drift
+			candidates = sorted(children + newcomers + ranked, key = _fitness_of, reverse = True)
+		else:
+			candidates = ranked[:elitism] + sorted(children + newcomers, key = _fitness_of, reverse = True) + \
+				ranked[elitism:]
+		if uniqueParents:
+			candidates = _unique_first(candidates)
+		population = candidates[:poolSize]
+		if yieldCountdown is not None:
+			yieldCountdown -= len(children)
+			if yieldCountdown <= 0:
+				yieldCountdown = yieldInterval
+				yield False, None
+
+# workers = N scores children in a process pool, get_fitness_batch scores them with one call per
+# batch. Either way children are still built in this process (so the random stream and the
+# survivor/annealing order are unchanged), but their fitness is deferred and batchSize of them
+# are scored at once, in order. batchSize defaults to one pass over the pool (at least 4 children
+# per worker with workers), since children in a batch are all made from the pool as it was
+# before the batch. Batching only pays off when get_fitness_batch scores rows faster together
+# than one at a time (a vectorized kernel, a remote service); a per-row loop gains nothing, and a
+# larger batchSize only makes children from staler parents. mutateInPlace lets the built-in
+# mutation change the parent's genes and undo that when the child is rejected, instead of copying
+# them for every child; get_fitness must not keep the genes it is given. With a Generational, a generational GA over a population of
+# poolSize replaces the steady-state loop; each generation's children are scored as one batch.
+# uniqueParents keeps duplicate genomes out of the parents pool (or the population) where it can.
+# annealing is the Annealing policy used once a parent reaches maxAge.
 def get_best(get_fitness, targetLen, optimalFitness, geneSet, display, 
 			custom_mutate = None, custom_create = None, maxAge = None,
-			poolSize = 1, crossover = None, maxSeconds = None):
+			poolSize = 1, crossover = None, maxSeconds = None, workers = None, fitnessCache = None,
+			fitness_delta = None, get_fitness_batch = None, batchSize = None, instrumentation = None,
+			seed = None, checkpoint = None, checkpointSeconds = 60, resume_from = None,
+			maxEvaluations = None, maxGenerations = None, maxStallGenerations = None, maxStallSeconds = None,
+			clockInterval = 1024, strategySelector = None, mutateInPlace = False, generational = None,
+			uniqueParents = False, annealing = None):
+
+	if instrumentation is not None:
+		display = instrumentation.timed('display', display)
+
+	bestParent = None
+	improvements = _search(get_fitness, targetLen, optimalFitness, geneSet,
+						custom_mutate, custom_create, maxAge, poolSize, crossover, maxSeconds, workers,
+						fitnessCache, fitness_delta, get_fitness_batch, batchSize, instrumentation, seed,
+						checkpoint, checkpointSeconds, resume_from, _runCounter,
+						maxEvaluations = maxEvaluations, maxGenerations = maxGenerations,
+						maxStallGenerations = maxStallGenerations, maxStallSeconds = maxStallSeconds,
+						clockInterval = clockInterval, strategySelector = strategySelector,
+						mutateInPlace = mutateInPlace, generational = generational, uniqueParents = uniqueParents,
+						annealing = annealing)
+	with contextlib.closing(improvements):
+		for timedOut, improvement in improvements:
+			bestParent = improvement
+			if timedOut:
+				break
+			display(improvement)
+	return bestParent
+
+# The engine behind get_best as a generator of (timedOut, improvement). It finishes after yielding
+# an optimal improvement; closing it early releases worker processes and writes the last checkpoint.
+# counter counts generations and evaluations (see _RunCounter), wrap_new_child lets other engines
+# (e.g. islands) see every child request and the parents pool, and yieldInterval makes it yield
+# (False, None) every yieldInterval generations so that callers can do other work. The search times
+# out (see _Budget) on maxSeconds, maxEvaluations, maxGenerations, maxStallGenerations or maxStallSeconds.
+def _search(get_fitness, targetLen, optimalFitness, geneSet,
+			custom_mutate = None, custom_create = None, maxAge = None, poolSize = 1, crossover = None,
+			maxSeconds = None, workers = None, fitnessCache = None, fitness_delta = None,
+			get_fitness_batch = None, batchSize = None, instrumentation = None, seed = None,
+			checkpoint = None, checkpointSeconds = 60, resume_from = None, counter = None, wrap_new_child = None,
+			yieldInterval = None, maxEvaluations = None, maxGenerations = None, maxStallGenerations = None,
+			maxStallSeconds = None, clockInterval = 1024, strategySelector = None, mutateInPlace = False,
+			generational = None, uniqueParents = False, annealing = None):
+
+	rng = get_random(seed)
 
-	if custom_mutate is None:
+	# wrapping the callbacks only when asked keeps the uninstrumented loop unchanged
+	if instrumentation is not None:
+		get_fitness, custom_mutate, custom_create, crossover, fitness_delta, get_fitness_batch = \
+			[instrumentation.timed(name, f) for name, f in [
+				('get_fitness', get_fitness), ('custom_mutate', custom_mutate),
+				('custom_create', custom_create), ('crossover', crossover), ('fitness_delta', fitness_delta),
+				('get_fitness_batch', get_fitness_batch)]]
+
+	if counter is not None:
+		get_fitness = counter.count_evaluations(get_fitness)
+		if fitness_delta is not None:
+			fitness_delta = counter.count_evaluations(fitness_delta)
+		if get_fitness_batch is not None:
+			get_fitness_batch = counter.count_batch_evaluations(get_fitness_batch)
+
+	evaluator = None
+	fnGetFitness = get_fitness
+	if workers is not None:
+		evaluator = _ParallelEvaluator(get_fitness, workers, fitnessCache, get_fitness_batch)
+		fnGetFitness = evaluator.defer
+	elif get_fitness_batch is not None:
+		evaluator = _BatchEvaluator(get_fitness_batch, fitnessCache)
+		fnGetFitness = evaluator.defer
+	elif fitnessCache is not None:
+		fnGetFitness = fitnessCache.wrap(get_fitness)
+
+	budget = _Budget.create(maxSeconds, maxEvaluations, maxGenerations, maxStallGenerations, maxStallSeconds,
+							clockInterval)
+	# counted here, in this process, even when the fitness is deferred to workers or a batch
+	if budget is not None and budget.CountsEvaluations:
+		fnGetFitness = budget.count_evaluations(fnGetFitness)
+		if fitness_delta is not None:
+			fitness_delta = budget.count_evaluations(fitness_delta)
+
+	# in place mutation needs the child scored before the next one is made, and nothing but the
+	# genes themselves to score it with, otherwise children are copies
+	undoLog = None
+	if mutateInPlace and custom_mutate is None and fitness_delta is None and evaluator is None and \
+			generational is None:
+		undoLog = _UndoLog()
+
+		def fnMutate(parent):
+			return _mutate_in_place(parent, geneSet, fnGetFitness, undoLog, rng)
+	elif custom_mutate is None:
 		def fnMutate(parent):
-			return _mutate(parent, geneSet, get_fitness)
+			return _mutate(parent, geneSet, fnGetFitness, fitness_delta, rng)
 	else:
 		def fnMutate(parent):
-			return _mutate_custom(parent, custom_mutate, get_fitness)
+			return _mutate_custom(parent, custom_mutate, fnGetFitness, fitness_delta)
 
 	if custom_create is None:
 		def fnGenerateParent():
-			return _generate_parent(targetLen, geneSet, get_fitness)
+			return _generate_parent(targetLen, geneSet, fnGetFitness, rng)
 	else:
 		def fnGenerateParent():
 			genes = custom_create()
-			return Chromosome(genes, get_fitness(genes), Strategies.Create)
+			return Chromosome(genes, fnGetFitness(genes), Strategies.Create)
 
 	strategyLookup = {
 		Strategies.Create: lambda p, i, o: fnGenerateParent(),
 		Strategies.Mutate: lambda p, i, o: fnMutate(p),
-		Strategies.Crossover: lambda p, i, o: _crossover(p.Genes, i, o, get_fitness, crossover, fnMutate, fnGenerateParent)
+		Strategies.Crossover: lambda p, i, o: _crossover(p.Genes, i, o, fnGetFitness, crossover, fnMutate, fnGenerateParent, rng)
 	}
 
-	usedStrategies = [strategyLookup[Strategies.Mutate]]
-	if crossover is not None:
-		usedStrategies.append(strategyLookup[Strategies.Crossover])
+	if strategySelector is None and crossover is not None:
+		strategySelector = StrategySelector()
+	if strategySelector is not None:
+		strategySelector.start([Strategies.Mutate, Strategies.Create] +
+								([Strategies.Crossover] if crossover is not None else []))
 
 		def fnNewChild(parent, index, parents):
-			return random.choice(usedStrategies)(parent, index, parents)
+			return strategyLookup[strategySelector.select(rng)](parent, index, parents)
 	else:
 		def fnNewChild(parent, index, parents):
 			return fnMutate(parent)
 
-	for timedOut, improvement in _get_improvement(fnNewChild, fnGenerateParent, maxAge, poolSize, maxSeconds):
-		if timedOut:
-			return improvement
-		display(improvement)
-		f = strategyLookup[improvement.Strategy]
-		usedStrategies.append(f)
-		if not optimalFitness > improvement.Fitness:
-			return improvement
-
-def _crossover(parentGenes, index, parents, get_fitness, crossover, mutate, generate_parent):
-	donorIndex = random.randrange(0, len(parents))
+	fnInitialParent = fnGenerateParent
+	# the generational engine scores each generation as one batch itself
+	if evaluator is not None and generational is None:
+		if batchSize is None:
+			batchSize = poolSize if workers is None else max(poolSize, 4 * workers)
+		fnNewChild = evaluator.batched(fnNewChild, batchSize)
+
+		def fnInitialParent():
+			return evaluator.score([fnGenerateParent()])[0]
+
+	if wrap_new_child is not None:
+		fnNewChild = wrap_new_child(fnNewChild)
+	if counter is not None:
+		fnNewChild = counter.count_generations(fnNewChild)
+	if instrumentation is not None:
+		fnNewChild = instrumentation.counting(fnNewChild)
+		if workers is not None:
+			evaluator.evaluate = instrumentation.timed('worker_batch', evaluator.evaluate)
+		instrumentation.start()
+
+	state = None
+	if resume_from is not None:
+		def fnRescore(chromosomes):
+			for chromosome in chromosomes:
+				chromosome.Fitness = fnGetFitness(chromosome.Genes)
+			return evaluator.score(chromosomes) if evaluator is not None else chromosomes
+
+		state = _Checkpoint.load(resume_from, rng, strategySelector, fnRescore)
+	checkpointer = None
+	if checkpoint is not None:
+		checkpointer = _Checkpoint(checkpoint, checkpointSeconds, rng, strategySelector)
+
+	if generational is not None:
+		improvements = _get_generational_improvement(fnNewChild, fnGenerateParent,
+													evaluator.score if evaluator is not None else _scored, poolSize,
+													generational, budget, rng, checkpointer, state, yieldInterval,
+													strategySelector, uniqueParents)
+	else:
+		improvements = _get_improvement(fnNewChild, fnInitialParent, maxAge, poolSize, budget, instrumentation, rng,
+										checkpointer, state, yieldInterval = yieldInterval,
+										strategySelector = strategySelector, undoLog = undoLog,
+										uniqueParents = uniqueParents, annealing = annealing)
+	try:
+		for timedOut, improvement in improvements:
+			if improvement is None:
+				yield False, None
+				continue
+			if timedOut:
+				yield True, improvement
+				return
+			if instrumentation is not None:
+				instrumentation.improved(improvement)
+			yield False, improvement
+			if not optimalFitness > improvement.Fitness:
+				return
+	finally:
+		if evaluator is not None:
+			evaluator.close()
+		if instrumentation is not None:
+			instrumentation.stop()
+		if checkpointer is not None:
+			checkpointer.save()
+
+# get_best for use inside an asyncio event loop. The search runs on the loop's thread and hands
+# control back to the loop every yieldInterval generations, so many solves can share one loop.
+# Cancelling the task stops the search; deadline (in loop.time()) ends it with the best found so far.
+# With an executor, fitness batches are scored on it and the search itself runs in the loop's default
+# executor meanwhile, so the loop is not blocked waiting for them. A process pool executor needs a
+# picklable get_fitness. Other options are get_best's keyword arguments.
+async def get_best_async(get_fitness, targetLen, optimalFitness, geneSet, display,
+						yieldInterval = 100, deadline = None, executor = None, **options):
+	loop = asyncio.get_running_loop()
+	if executor is not None:
+		def fnGetFitnessBatch(genesMatrix):
+			return list(executor.map(get_fitness, genesMatrix))
+
+		options.setdefault('get_fitness_batch', fnGetFitnessBatch)
+
+	improvements = _search(get_fitness, targetLen, optimalFitness, geneSet, yieldInterval = yieldInterval, **options)
+	bestParent = None
+	try:
+		while True:
+			if executor is None:
+				step = next(improvements, None)
+			else:
+				step = await _run_step(loop, improvements)
+			if step is None:
+				break
+			timedOut, improvement = step
+			if improvement is not None:
+				bestParent = improvement
+				if timedOut:
+					break
+				display(improvement)
+			if deadline is not None and loop.time() >= deadline:
+				break
+			await asyncio.sleep(0)
+	finally:
+		improvements.close()
+	return bestParent
+
+# A step that is still running when the task is cancelled has to finish before the search is closed
+async def _run_step(loop, improvements):
+	step = loop.run_in_executor(None, next, improvements, None)
+	try:
+		return await asyncio.shield(step)
+	except asyncio.CancelledError:
+		await asyncio.wait([step])
+		raise
+
+class Improvement:
+	Chromosome = None
+	Seconds = None # since the search started
+	Generation = None
+	Evaluations = None # fitness calls made by the engine, not by problem callbacks
+	TimedOut = False # the search ran out of time (or another budget), Chromosome is the best found
+
+	def __init__(self, chromosome, seconds, generation, evaluations, timedOut):
+		self.Chromosome = chromosome
+		self.Seconds = seconds
+		self.Generation = generation
+		self.Evaluations = evaluations
+		self.TimedOut = timedOut
+
+	def __str__(self):
+		return f'{self.Chromosome.Fitness}\t{self.Generation} generations\t{self.Evaluations} evaluations\t{self.Seconds:.3f}s'
+
+# Instead of calling display, yield an Improvement for each improvement get_best would have
+# displayed, then one with TimedOut set if maxSeconds (or another budget) ran out. options are
+# get_best's keyword arguments. Closing the generator stops the search.
+def iterate_best(get_fitness, targetLen, optimalFitness, geneSet, **options):
+	counter = _RunCounter()
+	startTime = time.perf_counter()
+	improvements = _search(get_fitness, targetLen, optimalFitness, geneSet, counter = counter, **options)
+	with contextlib.closing(improvements):
+		for timedOut, improvement in improvements:
+			if improvement is None:
+				continue
+			yield Improvement(improvement, time.perf_counter() - startTime, counter.Generations,
+							counter.Evaluations, timedOut)
+
+class _SearchStopped(Exception):
+	pass
+
+# Runs iterate_best in a background thread so the search does not wait on whoever consumes the
+# improvements. With coalesce, a consumer that falls behind only sees the latest improvement
+# (intermediate ones are dropped and counted in Dropped); otherwise the search blocks once
+# maxPending improvements are waiting. Iterate the stream to receive them; Result is the last one.
+class ImprovementStream:
+	Result = None
+	Dropped = 0
+
+	def __init__(self, get_fitness, targetLen, optimalFitness, geneSet, coalesce = True, maxPending = 16, **options):
+		self._improvements = iterate_best(get_fitness, targetLen, optimalFitness, geneSet,
+										wrap_new_child = self._stoppable, **options)
+		self._coalesce = coalesce
+		self._pending = deque()
+		self._maxPending = 1 if coalesce else maxPending
+		self._condition = threading.Condition()
+		self._finished = False
+		self._stopping = False
+		self._error = None
+		self._thread = threading.Thread(target = self._run, daemon = True)
+		self._thread.start()
+
+	def _stoppable(self, new_child):
+		def fnNewChild(parent, index, parents):
+			if self._stopping:
+				raise _SearchStopped()
+			return new_child(parent, index, parents)
+		return fnNewChild
+
+	def _run(self):
+		try:
+			for improvement in self._improvements:
+				with self._condition:
+					if len(self._pending) == self._maxPending:
+						if self._coalesce:
+							self._pending.popleft()
+							self.Dropped += 1
+						else:
+							self._condition.wait_for(lambda: len(self._pending) < self._maxPending or self._stopping)
+					self._pending.append(improvement)
+					self.Result = improvement
+					self._condition.notify_all()
+		except _SearchStopped:
+			pass
+		except Exception as error:
+			self._error = error
+		finally:
+			self._improvements.close()
+			with self._condition:
+				self._finished = True
+				self._condition.notify_all()
+
+	def __iter__(self):
+		while True:
+			with self._condition:
+				self._condition.wait_for(lambda: len(self._pending) > 0 or self._finished)
+				if len(self._pending) == 0:
+					if self._error is not None:
+						raise self._error
+					return
+				improvement = self._pending.popleft()
+				self._condition.notify_all()
+			yield improvement
+
+	# ask the search to stop before its next child and wait for it
+	def stop(self, timeout = None):
+		with self._condition:
+			self._stopping = True
+			self._condition.notify_all()
+		self._thread.join(timeout)
+
+# seed may be None (use the shared random module), an int, or a random.Random. To make a whole run
+# reproducible, problem callbacks should draw from the same random.Random they pass to get_best.
+def get_random(seed = None):
+	if seed is None or seed is random:
+		return random
+	if isinstance(seed, random.Random):
+		return seed
+	return random.Random(seed)
+
+# Independent streams for parallel engines, derived from rng so they are reproducible
+def split_random(rng, count):
+	return [random.Random(rng.getrandbits(64)) for _ in range(count)]
+
+# Saves the state of a get_best run at most every `seconds` so that it can be continued with
+# resume_from. Only plain data is written (genes, ages, strategy names and the random state), never
+# the problem's fitness objects or functions, so the same problem setup must be passed to get_best
+# again. On resume the chromosomes are rescored with it and the historical fitnesses that annealing
+# compares against restart from the restored best.
+class _Checkpoint:
+	def __init__(self, path, seconds, rng, strategySelector):
+		self._path = path
+		self._seconds = seconds
+		self._rng = rng
+		self._strategySelector = strategySelector
+		self._state = None
+		self._lastSaveTime = None
+
+	def __call__(self, parents, bestParent, historicalFitnesses, pindex):
+		self._state = parents, bestParent, historicalFitnesses, pindex
+		if self._lastSaveTime is None or time.time() - self._lastSaveTime >= self._seconds:
+			self.save()
+
+	def save(self):
+		if self._state is None:
+			return
+		parents, bestParent, _, pindex = self._state
+		data = {
+			'version': 3,
+			'parents': [_Checkpoint._record(p) for p in parents],
+			'bestParent': _Checkpoint._record(bestParent),
+			'pindex': pindex,
+			'strategySelector': self._strategySelector.getstate() if self._strategySelector is not None else None,
+			'random': self._rng.getstate()
+		}
+		# write then rename, so a run killed mid-save still leaves the previous checkpoint
+		temporaryPath = self._path + '.tmp'
+		with open(temporaryPath, mode = 'wb') as outfile:
+			pickle.dump(data, outfile, pickle.HIGHEST_PROTOCOL)
+		os.replace(temporaryPath, self._path)
+		self._lastSaveTime = time.time()
+
+	@staticmethod
+	def _record(chromosome):
+		return chromosome.Genes, chromosome.Age, chromosome.Strategy.name
+
+	# score(chromosomes) fills in the Fitness of the restored chromosomes and returns them
+	@staticmethod
+	def load(path, rng, strategySelector, score):
+		with open(path, mode = 'rb') as infile:
+			data = pickle.load(infile)
+		if data.get('version', 1) < 3:
+			raise ValueError('{} was written by an older version, it holds fitness objects instead of '
+							 'genes and ages and cannot be resumed'.format(path))
+		rng.setstate(data['random'])
+		if strategySelector is not None and data['strategySelector'] is not None:
+			strategySelector.setstate(data['strategySelector'])
+		chromosomes = []
+		for genes, age, strategy in data['parents'] + [data['bestParent']]:
+			chromosome = Chromosome(genes, None, Strategies[strategy])
+			chromosome.Age = age
+			chromosomes.append(chromosome)
+		chromosomes = score(chromosomes)
+		parents, bestParent = chromosomes[:-1], chromosomes[-1]
+		return parents, bestParent, [bestParent.Fitness], data['pindex']
+
+# One instance for the Scheduler, options are get_best's keyword arguments
+class Problem:
+	GetFitness = None
+	TargetLen = None
+	OptimalFitness = None
+	GeneSet = None
+	Display = None
+	Name = None
+	Options = None
+
+	def __init__(self, get_fitness, targetLen, optimalFitness, geneSet, display = None, name = None, **options):
+		self.GetFitness = get_fitness
+		self.TargetLen = targetLen
+		self.OptimalFitness = optimalFitness
+		self.GeneSet = geneSet
+		self.Display = display
+		self.Name = name
+		self.Options = options
+
+class ProblemResult:
+	Problem = None
+	Best = None
+	Solved = False
+	Evaluations = 0
+
+	def __init__(self, problem, best, solved, evaluations):
+		self.Problem = problem
+		self.Best = best
+		self.Solved = solved
+		self.Evaluations = evaluations
+
+# Solves many problems at once by giving each a slice of sliceGenerations generations in turn.
+# Problems that improved recently get slices more often (stride scheduling weighted by a decaying
+# improvement rate), solved or timed out problems are retired. With workers, the problems are
+# split across that many processes. maxSeconds bounds the whole run.
+class Scheduler:
+	Results = None
+	Seconds = 0
+
+	def __init__(self, workers = None, sliceGenerations = 100, maxSeconds = None, decay = 0.5):
+		self._workers = workers
+		self._sliceGenerations = sliceGenerations
+		self._maxSeconds = maxSeconds
+		self._decay = decay
+		self._problems = []
+
+	def submit(self, problem):
+		self._problems.append(problem)
+
+	def run(self):
+		startTime = time.perf_counter()
+		if self._workers is None:
+			results = self._solve(list(enumerate(self._problems)), startTime)
+		else:
+			results = self._solve_in_processes(startTime)
+		self.Seconds = time.perf_counter() - startTime
+		self.Results = [result for _, result in sorted(results, key = lambda r: r[0])]
+		self._problems = []
+		return self.Results
+
+	def _solve(self, problems, startTime):
+		heap = []
+		for index, problem in problems:
+			counter = _RunCounter()
+			search = _search(problem.GetFitness, problem.TargetLen, problem.OptimalFitness, problem.GeneSet,
+							counter = counter, yieldInterval = self._sliceGenerations, **problem.Options)
+			# pass, index, problem, search, counter, best, improvement rate
+			heappush(heap, (0.0, index, [problem, search, counter, None, 0.0]))
+
+		results = []
+		while len(heap) > 0:
+			if self._maxSeconds is not None and time.perf_counter() - startTime > self._maxSeconds:
+				break
+			passValue, index, entry = heappop(heap)
+			problem, search, counter, best, rate = entry
+			improvements = 0
+			finished = False
+			while True:
+				step = next(search, None)
+				if step is None:
+					finished = True
+					break
+				timedOut, improvement = step
+				if improvement is None:
+					break
+				best = improvement
+				if timedOut:
+					finished = True
+					break
+				improvements += 1
+				if problem.Display is not None:
+					problem.Display(improvement)
+			entry[3] = best
+			if finished:
+				search.close()
+				solved = best is not None and not problem.OptimalFitness > best.Fitness
+				results.append((index, ProblemResult(problem, best, solved, counter.Evaluations)))
+				continue
+			entry[4] = rate * self._decay + improvements
+			heappush(heap, (passValue + 1 / (1 + entry[4]), index, entry))
+
+		# out of time
+		for _, index, (problem, search, counter, best, _) in heap:
+			search.close()
+			results.append((index, ProblemResult(problem, best, False, counter.Evaluations)))
+		return results
+
+	# the problems reach the processes through fork, only results are sent back
+	def _solve_in_processes(self, startTime):
+		context = _process_context(forkOnly = True)
+		results = context.Queue()
+		problems = list(enumerate(self._problems))
+		processes = []
+		for i in range(self._workers):
+			share = problems[i::self._workers]
+
+			def fnSolve(share = share):
+				try:
+					for index, result in self._solve(share, startTime):
+						result.Problem = None # may hold closures
+						results.put((index, result))
+				except Exception as error:
+					results.put(_ProcessError(error))
+				finally:
+					results.put(None)
+
+			process = context.Process(target = fnSolve, daemon = True)
+			process.start()
+			processes.append(process)
+
+		solved = []
+		running = len(processes)
+		try:
+			while running > 0:
+				item = results.get()
+				if item is None:
+					running -= 1
+					continue
+				if isinstance(item, _ProcessError):
+					item.raise_again()
+				index, result = item
+				result.Problem = self._problems[index]
+				solved.append(item)
+		finally:
+			for process in processes:
+				process.terminate()
+				process.join()
+		return solved
+
+	@property
+	def SolvesPerSecond(self):
+		return sum(1 for r in self.Results if r.Solved) / self.Seconds if self.Seconds > 0 else 0
+
+	@property
+	def EvaluationsPerSecond(self):
+		return sum(r.Evaluations for r in self.Results) / self.Seconds if self.Seconds > 0 else 0
+
+	def __str__(self):
+		solved = sum(1 for r in self.Results if r.Solved)
+		return f'{solved}/{len(self.Results)} solved in {self.Seconds:.2f}s, ' \
+			f'{self.SolvesPerSecond:.1f} solves/s, {self.EvaluationsPerSecond:.0f} evaluations/s'
+
+class Topology(Enum):
+	Ring = 0 # each island sends its best to the next island
+	FullMesh = 1 # each island sends its best to every other island
+
+# Run one get_best loop per island, each in its own process with its own random stream (see
+# split_random). poolSize and maxAge may be a single value or one value per island. Every migrationInterval
+# children an island sends its best Chromosome to its neighbors and takes in the migrants
+# waiting for it in place of its worst parents.
+def get_best_islands(get_fitness, targetLen, optimalFitness, geneSet, display,
+			custom_mutate = None, custom_create = None, maxAge = None,
+			poolSize = 1, crossover = None, maxSeconds = None, fitness_delta = None,
+			get_fitness_batch = None, batchSize = None, islands = 4, migrationInterval = 100,
+			topology = Topology.Ring, seed = None):
+
+	poolSizes = poolSize if isinstance(poolSize, list) else [poolSize] * islands
+	maxAges = maxAge if isinstance(maxAge, list) else [maxAge] * islands
+	streams = split_random(get_random(seed), islands)
+
+	# the islands inherit the (closure based) problem functions through fork, see _ParallelEvaluator
+	context = _process_context(forkOnly = True)
+	inboxes = [context.Queue() for _ in range(islands)]
+	improvements = context.Queue()
+
+	processes = []
+	for i in range(islands):
+		if topology == Topology.Ring:
+			neighbors = [inboxes[(i + 1) % islands]] if islands > 1 else []
+		else:
+			neighbors = [inboxes[j] for j in range(islands) if j != i]
+
+		def fnRunIsland(index = i, neighbors = neighbors):
+			# problem callbacks that use the random module directly get a stream of their own too
+			random.seed(streams[index].getrandbits(64))
+
+			def fnWrapNewChild(new_child):
+				return _migrating(new_child, migrationInterval, inboxes[index], neighbors)
+
+			best = None
+			try:
+				for timedOut, improvement in _search(get_fitness, targetLen, optimalFitness, geneSet,
+													custom_mutate, custom_create, maxAges[index], poolSizes[index],
+													crossover, maxSeconds, fitness_delta = fitness_delta,
+													get_fitness_batch = get_fitness_batch, batchSize = batchSize,
+													seed = streams[index], wrap_new_child = fnWrapNewChild):
+					best = improvement
+					if not timedOut:
+						improvements.put((index, improvement))
+				improvements.put((index, best))
+			except Exception as error:
+				improvements.put((index, _ProcessError(error)))
+			finally:
+				improvements.put((index, None)) # island finished
+
+		process = context.Process(target = fnRunIsland, daemon = True)
+		process.start()
+		processes.append(process)
+
+	startTime = time.time()
+	bestParent = None
+	running = islands
+	try:
+		while running > 0:
+			timeout = None
+			if maxSeconds is not None:
+				timeout = max(0, maxSeconds - (time.time() - startTime))
+			try:
+				index, candidate = improvements.get(timeout = timeout)
+			except queue.Empty:
+				break
+			if candidate is None:
+				running -= 1
+				continue
+			if isinstance(candidate, _ProcessError):
+				candidate.raise_again()
+			if bestParent is not None and not candidate.Fitness > bestParent.Fitness:
+				continue
+			bestParent = candidate
+			display(candidate)
+			if not optimalFitness > candidate.Fitness:
+				break
+	finally:
+		for process in processes:
+			process.terminate()
+			process.join()
+	return bestParent
+
+def _migrating(new_child, migrationInterval, inbox, neighbors):
+	generation = 0
+
+	def fnNewChild(parent, index, parents):
+		nonlocal generation
+		generation += 1
+		if generation % migrationInterval == 0:
+			_migrate(parents, inbox, neighbors)
+		return new_child(parent, index, parents)
+
+	return fnNewChild
+
+def _migrate(parents, inbox, neighbors):
+	best = parents[0]
+	for parent in parents:
+		if parent.Fitness > best.Fitness:
+			best = parent
+	for neighbor in neighbors:
+		neighbor.put(best)
+	while True:
+		try:
+			migrant = inbox.get_nowait()
+		except queue.Empty:
+			return
+		worstIndex = 0
+		for i in range(1, len(parents)):
+			if parents[worstIndex].Fitness > parents[i].Fitness:
+				worstIndex = i
+		if migrant.Fitness > parents[worstIndex].Fitness:
+			migrant.Age = 0
+			parents[worstIndex] = migrant
+
+def _crossover(parentGenes, index, parents, get_fitness, crossover, mutate, generate_parent, rng = random):
+	donorIndex = rng.randrange(0, len(parents))
 	if donorIndex == index:
 		donorIndex = (donorIndex + 1) % len(parents)
 	childGenes = crossover(parentGenes, parents[donorIndex].Genes)
@@ -189,3 +1683,120 @@ def _crossover(parentGenes, index, parents, get_fitness, crossover, mutate, gene
 		return mutate(parents[index])
 	fitness = get_fitness(childGenes)
 	return Chromosome(childGenes, fitness, Strategies.Crossover)
+
+# Fitness functions of the current worker process, set once by _init_worker
+_workerGetFitness = None
+_workerGetFitnessBatch = None
+
+def _init_worker(get_fitness, get_fitness_batch):
+	global _workerGetFitness, _workerGetFitnessBatch
+	_workerGetFitness = get_fitness
+	_workerGetFitnessBatch = get_fitness_batch
+
+def _worker_fitness(genes):
+	return _workerGetFitness(genes)
+
+def _worker_fitness_batch(genesMatrix):
+	return list(_workerGetFitnessBatch(genesMatrix))
+
+# Scores children a batch at a time. get_fitness_batch(genesMatrix) receives one row of genes
+# per child and returns their fitnesses in the same order, e.g. from a single vectorized call.
+class _BatchEvaluator:
+	def __init__(self, get_fitness_batch, fitnessCache = None):
+		self._get_fitness_batch = get_fitness_batch
+		self._fitnessCache = fitnessCache
+
+	@staticmethod
+	def defer(genes):
+		return None # scored later, see score()
+
+	def evaluate(self, genesMatrix):
+		return self._get_fitness_batch(genesMatrix)
+
+	# Children that fitness_delta already scored when they were made keep that fitness, only the
+	# deferred ones are looked up in the cache and evaluated
+	def score(self, chromosomes):
+		unscored = [c for c in chromosomes if c.Fitness is None]
+		if self._fitnessCache is not None:
+			for chromosome in unscored:
+				chromosome.Fitness = self._fitnessCache.lookup(chromosome.Genes)
+			unscored = [c for c in unscored if c.Fitness is None]
+		if len(unscored) == 0:
+			return chromosomes
+		fitnesses = self.evaluate([c.Genes for c in unscored])
+		for chromosome, fitness in zip(unscored, fitnesses):
+			chromosome.Fitness = fitness
+			if self._fitnessCache is not None:
+				self._fitnessCache.add(chromosome.Genes, fitness)
+		return chromosomes
+
+	# Wrap new_child so that it hands out pre-scored children. A batch is built by walking the
+	# parent indexes in the same order _get_improvement does, then scored in one call.
+	# Pool members replaced while building the batch (see _crossover) are scored with it.
+	def batched(self, new_child, batchSize):
+		pending = deque()
+
+		def fnNewChild(parent, index, parents):
+			if len(pending) == 0:
+				pindex = index
+				for _ in range(batchSize):
+					pending.append(new_child(parents[pindex], pindex, parents))
+					pindex = pindex - 1 if pindex > 0 else len(parents) - 1
+				unscored = [p for p in parents if p.Fitness is None]
+				self.score(list(pending) + unscored)
+			return pending.popleft()
+
+		return fnNewChild
+
+	def close(self):
+		pass
+
+# Child processes started with fork inherit the problem's (closure based) functions, so fork is
+# used where the platform has it. Elsewhere whatever crosses to the processes must be picklable,
+# which the nested process targets of the Scheduler and get_best_islands never are (forkOnly).
+def _process_context(forkOnly = False):
+	if 'fork' in multiprocessing.get_all_start_methods():
+		return multiprocessing.get_context('fork')
+	if forkOnly:
+		raise RuntimeError('running problems in their own processes needs the fork start method, '
+						   'which this platform does not have')
+	return multiprocessing.get_context()
+
+# An exception raised in a child process, sent to the parent to be raised again there. The child's
+# traceback travels as text and is chained to it; an exception that does not survive pickling is
+# replaced by a RuntimeError describing it.
+class _ProcessError:
+	def __init__(self, error):
+		try:
+			pickle.loads(pickle.dumps(error))
+		except Exception:
+			error = RuntimeError(repr(error))
+		self.Error = error
+		self.Traceback = traceback.format_exc()
+
+	def raise_again(self):
+		raise self.Error from RuntimeError('raised in a child process\n' + self.Traceback)
+
+class _ParallelEvaluator(_BatchEvaluator):
+	# The fitness functions in the *Tests modules are closures, which cannot be pickled. With the
+	# fork start method the pool inherits get_fitness through the initializer instead, so only genes
+	# and fitness values cross the process boundary. Without fork, get_fitness must be picklable.
+	def __init__(self, get_fitness, workers, fitnessCache = None, get_fitness_batch = None):
+		super().__init__(get_fitness_batch, fitnessCache)
+		context = _process_context()
+		self._pool = context.Pool(workers, initializer = _init_worker, initargs = (get_fitness, get_fitness_batch))
+		self._workers = workers
+
+	# results come back in submission order, so the engine stays reproducible
+	def evaluate(self, genesMatrix):
+		if self._get_fitness_batch is None:
+			chunkSize = max(1, len(genesMatrix) // (4 * self._workers))
+			return self._pool.map(_worker_fitness, genesMatrix, chunkSize)
+		# one sub-matrix per worker
+		rowsPerWorker = -(-len(genesMatrix) // self._workers)
+		chunks = [genesMatrix[i:i + rowsPerWorker] for i in range(0, len(genesMatrix), rowsPerWorker)]
+		return [f for fitnesses in self._pool.map(_worker_fitness_batch, chunks, 1) for f in fitnesses]
+
+	def close(self):
+		self._pool.terminate()
+		self._pool.join()
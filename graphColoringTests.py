@@ -1,27 +1,123 @@
+import os
+import random
+import tempfile
 import unittest
 import datetime
 import genetic
 
+from array import array
+from itertools import accumulate
+from operator import ne
+
+# Reads a DIMACS graph a line at a time into a Graph. DIMACS numbers the nodes 1..NN, so node id
+# k is node k - 1 and nodes without edges are kept. Files that name their nodes instead (such as
+# adjacent_states.col) have them numbered in the order they first appear. Repeated edges (in either
+# direction) are kept once and self-loops are dropped, as no coloring can satisfy them. Record types:
+#	c ...			comment
+#	p edge NN EE	NN nodes and EE edges, used to size the node and edge arrays
+#	e aa bb			edge between nodes aa and bb
+#	n aa ww			node aa has weight ww
 def load_data(localFileName):
-	""" expects: T D1 [D2 ... DN]
-	where T is the record type
-	and D1 .. DN are record-type appropriate data elements
-	"""
-	rules = set()
-	nodes = set()
-	with open(localFileName, mode='r') as infile:
-		content = infile.read().splitlines()
-	for row in content:
-		if row[0] == 'e': # e aa bb, aa and bb are node ids
-			nodeIds = row.split(' ')[1:3]
-			rules.add(Rule(nodeIds[0], nodeIds[1]))
-			nodes.add(nodeIds[0])
-			nodes.add(nodeIds[1])
-		continue
-		if row[0] == 'n': # n aa ww, aa is a node id, ww is a weight
-			nodeIds = row.split(' ')
-			nodes.add(nodeIds[1])
-	return rules, nodes
+	nodeIds = []
+	weights = array('q')
+	nodeNameLookup = {}
+	edgeKeys = set() # lower index << 32 | higher index
+	edgeStarts = array('i')
+	edgeEnds = array('i')
+	edgeCount = 0
+
+	def fnAddNodes(count):
+		nodeIds.extend(str(id) for id in range(len(nodeIds) + 1, count + 1))
+		weights.frombytes(bytes(8 * (count - len(weights))))
+
+	def fnIndex(nodeId):
+		if nodeId.isdigit():
+			index = int(nodeId) - 1
+			if index < 0:
+				raise ValueError(f'{localFileName}: node ids start at 1, not {nodeId}')
+			if index >= len(nodeIds):
+				fnAddNodes(index + 1)
+			return index
+		index = nodeNameLookup.get(nodeId)
+		if index is None:
+			index = nodeNameLookup[nodeId] = len(nodeNameLookup)
+			if index >= len(nodeIds):
+				fnAddNodes(index + 1)
+			nodeIds[index] = nodeId
+		return index
+
+	with open(localFileName, mode = 'r') as infile:
+		for row in infile:
+			fields = row.split()
+			if len(fields) == 0:
+				continue
+			if fields[0] == 'e':
+				start, end = fnIndex(fields[1]), fnIndex(fields[2])
+				if start == end:
+					continue
+				if start > end:
+					start, end = end, start
+				key = start << 32 | end
+				if key in edgeKeys:
+					continue
+				edgeKeys.add(key)
+				if edgeCount < len(edgeStarts):
+					edgeStarts[edgeCount] = start
+					edgeEnds[edgeCount] = end
+				else:
+					edgeStarts.append(start)
+					edgeEnds.append(end)
+				edgeCount += 1
+			elif fields[0] == 'n':
+				weights[fnIndex(fields[1])] = int(fields[2])
+			elif fields[0] == 'p' and edgeCount == 0:
+				fnAddNodes(int(fields[2]))
+				edgeStarts = array('i', bytes(4 * int(fields[3])))
+				edgeEnds = array('i', bytes(4 * int(fields[3])))
+	# named nodes only fill as many of the header's slots as there are names
+	if len(nodeNameLookup) > 0:
+		del nodeIds[len(nodeNameLookup):]
+		del weights[len(nodeNameLookup):]
+	del edgeStarts[edgeCount:]
+	del edgeEnds[edgeCount:]
+	return Graph(nodeIds, edgeStarts, edgeEnds, weights)
+
+# A graph as integer arrays. Node i is NodeIds[i] with weight Weights[i], edge k joins
+# EdgeStarts[k] and EdgeEnds[k], and the neighbours of node i are
+# Neighbours[Offsets[i]:Offsets[i + 1]] (CSR adjacency).
+class Graph:
+	NodeIds = None
+	Weights = None
+	EdgeStarts = None
+	EdgeEnds = None
+	Offsets = None
+	Neighbours = None
+
+	def __init__(self, nodeIds, edgeStarts, edgeEnds, weights = None):
+		self.NodeIds = nodeIds
+		self.Weights = weights if weights is not None else array('q', bytes(8 * len(nodeIds)))
+		self.EdgeStarts = edgeStarts
+		self.EdgeEnds = edgeEnds
+		degrees = [0] * len(nodeIds)
+		for start, end in zip(edgeStarts, edgeEnds):
+			degrees[start] += 1
+			degrees[end] += 1
+		self.Offsets = array('i', accumulate(degrees, initial = 0))
+		self.Neighbours = array('i', bytes(4 * self.Offsets[-1]))
+		nextSlot = self.Offsets[:-1]
+		for start, end in zip(self.EdgeStarts, self.EdgeEnds):
+			self.Neighbours[nextSlot[start]] = end
+			nextSlot[start] += 1
+			self.Neighbours[nextSlot[end]] = start
+			nextSlot[end] += 1
+
+# Numbers the nodes in sorted order and turns each Rule into an edge between their indexes
+def compile_graph(rules, nodes):
+	nodeIds = sorted(nodes)
+	nodeIndexLookup = {key: index for index, key in enumerate(nodeIds)}
+	edgeStarts = array('i', (nodeIndexLookup[rule.Node] for rule in rules))
+	edgeEnds = array('i', (nodeIndexLookup[rule.Adjacent] for rule in rules))
+	return Graph(nodeIds, edgeStarts, edgeEnds)
 
 def build_rules(items):
 
@@ -43,9 +139,23 @@ def build_rules(items):
 
 	return rulesAdded.keys()
 
-def get_fitness(genes, rules, stateIndexLookup):
-	rulesThatPass = sum(1 for rule in rules if rule.IsValid(genes, stateIndexLookup))
-	return rulesThatPass
+# The number of edges whose nodes have different colors
+def get_fitness(genes, graph):
+	return sum(map(ne, map(genes.__getitem__, graph.EdgeStarts), map(genes.__getitem__, graph.EdgeEnds)))
+
+# Only the edges of recolored nodes can change, so adjust the parent's count by walking their
+# neighbours. An edge between two recolored nodes is counted from the lower index only.
+def get_fitness_delta(parentGenes, parentFitness, changedIndexes, genes, graph):
+	offsets, neighbours = graph.Offsets, graph.Neighbours
+	recolored = {index for index in changedIndexes if parentGenes[index] != genes[index]}
+	fitness = parentFitness
+	for index in recolored:
+		oldColor, newColor = parentGenes[index], genes[index]
+		for neighbour in neighbours[offsets[index]:offsets[index + 1]]:
+			if neighbour in recolored and neighbour <= index:
+				continue
+			fitness += (newColor != genes[neighbour]) - (oldColor != parentGenes[neighbour])
+	return fitness
 
 def display(candidate, startTime):
 	timeDiff = datetime.datetime.now() - startTime
@@ -66,27 +176,78 @@ class GraphColoringTests(unittest.TestCase):
 	def test_benchmark(self):
 		genetic.Benchmark.run(lambda: self.test_R100_1gb())
 
+	def test_fitness_delta(self):
+		rng = random.Random(1)
+		graph = random_graph(200, 2000, rng)
+		genes = [rng.choice('RGB') for _ in range(200)]
+		fitness = get_fitness(genes, graph)
+		for _ in range(100):
+			childGenes = genes[:]
+			changedIndexes = rng.sample(range(200), rng.randint(1, 5))
+			for index in changedIndexes:
+				childGenes[index] = rng.choice('RGB')
+			self.assertEqual(get_fitness_delta(genes, fitness, changedIndexes, childGenes, graph),
+							get_fitness(childGenes, graph))
+
+	def test_load_data(self):
+		with tempfile.TemporaryDirectory() as directory:
+			fileName = os.path.join(directory, 'graph.col')
+			with open(fileName, mode = 'w') as outfile:
+				outfile.write('c a comment\np edge 5 6\ne 1 2\ne 2 3\ne 2 1\n\ne 3 3\ne 3\t1\nn 2 7\nn 5 1\n')
+			graph = load_data(fileName)
+			with open(fileName, mode = 'w') as outfile:
+				outfile.write('p edge 4 2\ne AL FL\ne FL GA\nn GA 2\n')
+			namedGraph = load_data(fileName)
+		self.assertEqual(graph.NodeIds, ['1', '2', '3', '4', '5'])
+		self.assertEqual(list(graph.Weights), [0, 7, 0, 0, 1])
+		self.assertEqual(sorted(zip(graph.EdgeStarts, graph.EdgeEnds)), [(0, 1), (0, 2), (1, 2)])
+		self.assertEqual(sorted(graph.Neighbours[graph.Offsets[1]:graph.Offsets[2]]), [0, 2])
+		self.assertEqual(graph.Offsets[3], graph.Offsets[4])
+		self.assertEqual(get_fitness(['R', 'G', 'B', 'R', 'G'], graph), 3)
+		self.assertEqual(namedGraph.NodeIds, ['AL', 'FL', 'GA'])
+		self.assertEqual(list(namedGraph.Weights), [0, 0, 2])
+		self.assertEqual(list(zip(namedGraph.EdgeStarts, namedGraph.EdgeEnds)), [(0, 1), (1, 2)])
+
+	def test_random_graph(self):
+		self.color_graph(random_graph(100, 500, random.Random(2), colors = 6),
+						["Red", "Orange", "Yellow", "Green", "Blue", "Indigo"])
+
 	def color(self, file, colors):
-		rules, nodes = load_data(file)
-		optimalValue = len(rules)
+		self.color_graph(load_data(file), colors)
+
+	def color_graph(self, graph, colors):
+		optimalValue = len(graph.EdgeStarts)
 		colorLookup = {color[0]: color for color in colors}
 		geneset = list(colorLookup.keys())
 		startTime = datetime.datetime.now()
-		nodeIndexLookup = {key: index for index, key in enumerate(sorted(nodes))}
 
 		def fnDisplay(candidate):
 			display(candidate, startTime)
 		
 		def fnGetFitness(genes):
-			return get_fitness(genes, rules, nodeIndexLookup)
+			return get_fitness(genes, graph)
 
-		best = genetic.get_best(fnGetFitness, len(nodes), optimalValue, geneset, fnDisplay)
+		def fnFitnessDelta(parentGenes, parentFitness, changedIndexes, genes):
+			return get_fitness_delta(parentGenes, parentFitness, changedIndexes, genes, graph)
+
+		best = genetic.get_best(fnGetFitness, len(graph.NodeIds), optimalValue, geneset, fnDisplay,
+								fitness_delta = fnFitnessDelta)
 		self.assertTrue(not optimalValue > best.Fitness)
 
-		keys = sorted(nodes)
-		for index in range(len(nodes)):
+		keys = graph.NodeIds
+		for index in range(len(keys)):
 			print(keys[index] + " is " + colorLookup[best.Genes[index]])
 
+# edgeCount distinct edges between nodeCount nodes. With colors, the nodes are split into that
+# many groups and only nodes in different groups are joined, so that many colors are enough.
+def random_graph(nodeCount, edgeCount, rng = random, colors = None):
+	rules = set()
+	while len(rules) < edgeCount:
+		node, adjacent = rng.sample(range(nodeCount), 2)
+		if colors is None or node % colors != adjacent % colors:
+			rules.add(Rule(f'{node:04}', f'{adjacent:04}'))
+	return compile_graph(rules, [f'{node:04}' for node in range(nodeCount)])
+
 class Rule:
 	Node = None
 	Adjacent = None
@@ -104,9 +265,4 @@ class Rule:
 		return hash(self.Node) * 397 ^ hash(self.Adjacent)
 
 	def __str__(self):
-		return self.Node + " -> " + self.Adjacent
-
-	def IsValid(self, genes, nodeIndexLookup):
-		index = nodeIndexLookup[self.Node]
-		adjacentStateIndex = nodeIndexLookup[self.Adjacent]
-		return genes[index] != genes[adjacentStateIndex]
\ No newline at end of file
+		return self.Node + " -> " + self.Adjacent
\ No newline at end of file
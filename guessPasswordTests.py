@@ -1,5 +1,6 @@
 import random
 import time
+import operator
 #from pip import __main__
 import unittest
 from . import genetic
@@ -8,6 +9,9 @@ from . import genetic
 def get_fitness(genes, target):
 	return sum(1 for expected, actual in zip(target, genes) if expected == actual)
 
+def get_fitness_batch(genesMatrix, target):
+	return [sum(map(operator.eq, target, genes)) for genes in genesMatrix]
+
 # # Display 
 def display(candidate, startTime):
 	timeDiff = time.time() - startTime
@@ -25,26 +29,47 @@ class GuessPasswordTest(unittest.TestCase):
 		target = "For I am fearfully and wonderfully made."
 		self.guess_password(target)
 
-	def test_Random(self):
+	def test_Random(self, mutateInPlace = False):
 		length = 250
 		target = ''.join(random.choice(self.geneset) for _ in range(length))
-		self.guess_password(target)
+		self.guess_password(target, mutateInPlace = mutateInPlace)
+
+	def test_stream(self):
+		target = 'Hello World!'
+
+		def fnGetFitness(genes):
+			return get_fitness(genes, target)
+
+		stream = genetic.ImprovementStream(fnGetFitness, len(target), len(target), self.geneset)
+		for improvement in stream:
+			print(f'{''.join(improvement.Chromosome.Genes)}\t{improvement}')
+		self.assertEqual(''.join(stream.Result.Chromosome.Genes), target)
+
+	def test_batch(self):
+		self.guess_password("For I am fearfully and wonderfully made.", batch = True)
 
 	def test_benchmark(self):
 		genetic.Benchmark.run(self.test_Random)
+
+	def test_benchmark_in_place(self):
+		genetic.Benchmark.run(lambda: self.test_Random(mutateInPlace = True))
 		#genetic.Benchmark.run(self.test_For_I_am_fearfully_and_wonderfully_made)
 
-	def guess_password(self, target):
+	def guess_password(self, target, batch = False, mutateInPlace = False):
 		startTime = time.time()
 
 		def fnGetFitness(genes):
 			return get_fitness(genes, target)
 
+		def fnGetFitnessBatch(genesMatrix):
+			return get_fitness_batch(genesMatrix, target)
+
 		def fnDisplay(candidate):
 			display(candidate, startTime)		
 
 		optimalFitness = len(target)
-		best = genetic.get_best(fnGetFitness, len(target), optimalFitness, self.geneset, fnDisplay)
+		best = genetic.get_best(fnGetFitness, len(target), optimalFitness, self.geneset, fnDisplay,
+								get_fitness_batch = fnGetFitnessBatch if batch else None, mutateInPlace = mutateInPlace)
 
 		self.assertEqual(''.join(best.Genes), target)
 
@@ -91,10 +91,8 @@ def get_fitness(genes):
 
 	return Fitness(totalWeight, totalVolume, totalValue)
 
-class Fitness:
-	TotalWeight = None
-	TotalVolume = None
-	TotalValue  = None
+class Fitness(genetic.FitnessValue):
+	__slots__ = ('TotalWeight', 'TotalVolume', 'TotalValue')
 
 	def __init__(self, totalWeight, totalVolume, totalValue):
 		self.TotalValue  = totalValue
@@ -114,9 +114,8 @@ def display(candidate, startTime, fnGenesToInputs):
 	result = ', '.join(f'{s} = {v}' for s, v in zip(symbols, fnGenesToInputs(candidate.Genes)))
 	print(f'{result}\t{candidate.Fitness}\t{str(timeDiff)}')
 
-class Fitness:
-
-	TotalDifference = None
+class Fitness(genetic.FitnessValue):
+	__slots__ = ('TotalDifference',)
 
 	def __init__(self, totalDifference):
 		self.TotalDifference = totalDifference
@@ -1,5 +1,8 @@
+import os
+import pickle
 import random
 import unittest
+import tempfile
 import genetic
 
 from datetime import datetime as dt
@@ -18,7 +21,63 @@ class MagicSquareTests(unittest.TestCase):
 	def test_size_10(self):
 		self.generate(10, 10000)
 
-	def generate(self, diagonalSize, maxAge):
+	def test_size_4_workers(self):
+		self.generate(4, 50, workers = 4)
+
+	# without fitness_delta every child is scored in the pool, and the scores come back in the order
+	# the children were made, so a seeded run improves exactly as the same run scored serially
+	def test_size_4_workers_reproducible(self):
+		instrumentation = genetic.Instrumentation()
+		pooled = []
+		self.generate(4, 50, workers = 2, seed = 7, poolSize = 8, maxGenerations = 2000, fitnessDelta = False,
+					instrumentation = instrumentation, improvements = pooled)
+		serial = []
+		self.generate(4, 50, seed = 7, poolSize = 8, maxGenerations = 2000, fitnessDelta = False, batched = True,
+					improvements = serial)
+		self.assertGreater(instrumentation.CallbackCalls['worker_batch'], 100)
+		self.assertGreater(len(pooled), 1)
+		self.assertEqual(pooled, serial)
+
+	def test_size_5_islands(self):
+		self.generate(5, 500, islands = 4)
+
+	def test_islands_error(self):
+		def fnGetFitness(genes):
+			raise ValueError('no fitness')
+
+		with self.assertRaisesRegex(ValueError, 'no fitness'):
+			genetic.get_best_islands(fnGetFitness, 5, Fitness(0), [0, 1], print, islands = 2)
+
+	def test_size_4_seeded(self):
+		first = self.generate(4, 50, seed = 7)
+		second = self.generate(4, 50, seed = 7)
+		self.assertEqual(first.Genes, second.Genes)
+
+	# a run stopped by its budget and resumed from its checkpoint ends where an uninterrupted run does,
+	# which needs the pool, the parent index and the random state restored. No parent reaches maxAge,
+	# so the restarted annealing history plays no part.
+	def test_size_4_checkpoint(self):
+		with tempfile.TemporaryDirectory() as directory:
+			path = os.path.join(directory, 'size_4.checkpoint')
+			uninterrupted = self.generate(4, 10000, seed = 3, poolSize = 5, maxGenerations = 400)
+			stopped = self.generate(4, 10000, seed = 3, poolSize = 5, maxGenerations = 200, checkpoint = path)
+			with open(path, mode = 'rb') as infile:
+				saved = pickle.load(infile)
+			self.assertEqual(saved['bestParent'][0], stopped.Genes)
+			self.assertEqual(len(saved['parents']), 5)
+
+			restored = self.generate(4, 10000, poolSize = 5, maxGenerations = 0, resume_from = path)
+			self.assertEqual(restored.Genes, stopped.Genes)
+			self.assertEqual(restored.Fitness.SumOfDifferences, stopped.Fitness.SumOfDifferences)
+
+			resumed = self.generate(4, 10000, poolSize = 5, maxGenerations = 200, resume_from = path)
+			self.assertEqual(resumed.Genes, uninterrupted.Genes)
+			self.assertEqual(resumed.Fitness.SumOfDifferences, uninterrupted.Fitness.SumOfDifferences)
+
+	def generate(self, diagonalSize, maxAge, workers = None, islands = None, seed = None,
+				checkpoint = None, resume_from = None, poolSize = 1, maxGenerations = None, fitnessDelta = True,
+				batched = False, instrumentation = None, improvements = None):
+		rng = genetic.get_random(seed)
 		nSquared = diagonalSize * diagonalSize
 		geneset = [i for i in range(1, nSquared + 1)]
 		expectedSum = diagonalSize * (nSquared + 1) / 2
@@ -27,21 +86,40 @@ class MagicSquareTests(unittest.TestCase):
 			return get_fitness(genes, diagonalSize, expectedSum)
 
 		def fnCustomCreate():
-			return random.sample(geneset, len(geneset))
+			return rng.sample(geneset, len(geneset))
 
 		def fnDisplay(candidate):
 			display(candidate, diagonalSize, startTime)
+			if improvements is not None:
+				improvements.append((candidate.Genes[:], candidate.Fitness.SumOfDifferences))
+
+		def fnGetFitnessBatch(genesMatrix):
+			return [fnGetFitness(genes) for genes in genesMatrix]
 
 		geneIndexes = [i for i in range(0, len(geneset))]
 
 		def fnMutate(genes):
-			mutate(genes, geneIndexes)
+			return mutate(genes, geneIndexes, rng)
+
+		def fnFitnessDelta(parentGenes, parentFitness, changedIndexes, genes):
+			return get_fitness_delta(parentGenes, parentFitness, changedIndexes, genes, diagonalSize, expectedSum)
 
 		optimalValue = Fitness(0)
 		startTime = dt.now()
-		best = genetic.get_best(fnGetFitness, nSquared, optimalValue, geneset, fnDisplay, fnMutate, fnCustomCreate, maxAge)
-
-		self.assertTrue(not optimalValue > best.Fitness)
+		if islands is None:
+			best = genetic.get_best(fnGetFitness, nSquared, optimalValue, geneset, fnDisplay, fnMutate, fnCustomCreate, maxAge,
+									poolSize = poolSize, workers = workers,
+									fitness_delta = fnFitnessDelta if fitnessDelta else None,
+									get_fitness_batch = fnGetFitnessBatch if batched else None,
+									instrumentation = instrumentation, seed = rng, checkpoint = checkpoint,
+									resume_from = resume_from, maxGenerations = maxGenerations)
+		else:
+			best = genetic.get_best_islands(fnGetFitness, nSquared, optimalValue, geneset, fnDisplay, fnMutate, fnCustomCreate,
+											maxAge, fitness_delta = fnFitnessDelta, islands = islands)
+
+		if maxGenerations is None:
+			self.assertTrue(not optimalValue > best.Fitness)
+		return best
 
 def get_fitness(genes, diagonalSize, expectedSum):
 	rows, columns, northeastDiagonalSum, southeastDiagonalSum = get_sums(genes, diagonalSize)
@@ -50,7 +128,40 @@ def get_fitness(genes, diagonalSize, expectedSum):
 							for s in rows + columns + [southeastDiagonalSum, northeastDiagonalSum]
 							if s != expectedSum)
 
-	return Fitness(sumOfDifferences)
+	fitness = Fitness(sumOfDifferences)
+	fitness.Sums = rows, columns, northeastDiagonalSum, southeastDiagonalSum
+	return fitness
+
+# Only the rows, columns and diagonals crossing a changed index can change, so update the parent's
+# sums and their differences from expectedSum instead of summing the whole square again
+def get_fitness_delta(parentGenes, parentFitness, changedIndexes, genes, diagonalSize, expectedSum):
+	rows, columns, northeastDiagonalSum, southeastDiagonalSum = parentFitness.Sums
+	rows = rows[:]
+	columns = columns[:]
+	sumOfDifferences = parentFitness.SumOfDifferences
+
+	def difference(s):
+		return int(abs(s - expectedSum))
+
+	for index in set(changedIndexes):
+		change = genes[index] - parentGenes[index]
+		if change == 0:
+			continue
+		row, column = divmod(index, diagonalSize)
+		sumOfDifferences += difference(rows[row] + change) - difference(rows[row])
+		rows[row] += change
+		sumOfDifferences += difference(columns[column] + change) - difference(columns[column])
+		columns[column] += change
+		if row == column:
+			sumOfDifferences += difference(southeastDiagonalSum + change) - difference(southeastDiagonalSum)
+			southeastDiagonalSum += change
+		if row + column == diagonalSize - 1:
+			sumOfDifferences += difference(northeastDiagonalSum + change) - difference(northeastDiagonalSum)
+			northeastDiagonalSum += change
+
+	fitness = Fitness(sumOfDifferences)
+	fitness.Sums = rows, columns, northeastDiagonalSum, southeastDiagonalSum
+	return fitness
 
 def get_sums(genes, diagonalSize):
 	rows = [0 for _ in range(diagonalSize)]
@@ -79,15 +190,17 @@ def display(candidate, diagonalSize, startTime):
 	print(f'{northeastDiagonalSum}\t{columns}\t{southeastDiagonalSum}')
 	print(f' - - - - - - - - - - - - {candidate.Fitness} {str(timeDiff)}')
 
-def mutate(genes, indexes):
-	indexA, indexB = random.sample(indexes, 2)
+def mutate(genes, indexes, rng = random):
+	indexA, indexB = rng.sample(indexes, 2)
 	genes[indexA], genes[indexB] = genes[indexB], genes[indexA]
+	return [indexA, indexB]
 
-class Fitness:
-	SumOfDifferences = None
+class Fitness(genetic.FitnessValue):
+	__slots__ = ('SumOfDifferences', 'Sums')
 
 	def __init__(self, sumOfDifferences):
 		self.SumOfDifferences = sumOfDifferences
+		self.Sums = None # rows, columns, northeast and southeast diagonal sums, used by get_fitness_delta
 
 	def __gt__(self, other):
 		return self.SumOfDifferences < other.SumOfDifferences
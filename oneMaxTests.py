@@ -1,3 +1,7 @@
+import json
+import os
+import pickle
+import tempfile
 import time
 import unittest
 from . import genetic
@@ -6,6 +10,9 @@ from . import genetic
 def get_fitness(genes):
 	return genes.count(1)
 
+def get_fitness_batch(genesMatrix):
+	return [genes.count(1) for genes in genesMatrix]
+
 def display(candidate, startTime):
 	timeDiff = time.time() - startTime
 	print('{0}...{1}\t{2:3.2f}\t{3}'.format(
@@ -16,7 +23,7 @@ def display(candidate, startTime):
 		))
 
 class OneMaxTests(unittest.TestCase):
-	def test(self, length = 100):
+	def test(self, length = 100, batch = False, mutateInPlace = False):
 
 		startTime = time.time()
 		geneset = [0, 1]
@@ -28,11 +35,155 @@ class OneMaxTests(unittest.TestCase):
 			return get_fitness(genes)
 
 		optimalFitness = length
-		best = genetic.get_best(fnGetFitness, length, optimalFitness, geneset, fnDisplay)
+		best = genetic.get_best(fnGetFitness, length, optimalFitness, geneset, fnDisplay,
+								get_fitness_batch = get_fitness_batch if batch else None, mutateInPlace = mutateInPlace)
 		self.assertEqual(best.Fitness, optimalFitness)
 
+	def test_batch(self):
+		self.test(batch = True)
+
+	def test_batch_fitness_delta(self):
+		batchRows = []
+
+		def fnGetFitnessBatch(genesMatrix):
+			batchRows.append(len(genesMatrix))
+			return get_fitness_batch(genesMatrix)
+
+		def fnFitnessDelta(parentGenes, parentFitness, changedIndexes, genes):
+			return parentFitness + sum(genes[i] - parentGenes[i] for i in set(changedIndexes))
+
+		best = genetic.get_best(get_fitness, 200, 200, [0, 1], lambda candidate: None, seed = 1,
+								fitness_delta = fnFitnessDelta, get_fitness_batch = fnGetFitnessBatch,
+								fitnessCache = genetic.FitnessCache(1000))
+		self.assertEqual(best.Fitness, 200)
+		self.assertEqual(sum(batchRows), 1) # only the first parent, every child is scored by the delta
+
+	def test_generational(self, generational = None, batch = False):
+		if generational is None:
+			generational = genetic.Generational()
+		best = genetic.get_best(get_fitness, 100, 100, [0, 1], lambda candidate: None, poolSize = 50,
+								generational = generational, get_fitness_batch = get_fitness_batch if batch else None)
+		self.assertEqual(best.Fitness, 100)
+
+	def test_generational_batch(self):
+		self.test_generational(batch = True)
+
+	def test_rank_selection(self):
+		self.test_generational(genetic.Generational(selection = genetic.Selection.Rank))
+
+	def test_truncation_selection(self):
+		self.test_generational(genetic.Generational(selection = genetic.Selection.Truncation))
+
+	def test_generational_few_offspring(self):
+		with tempfile.TemporaryDirectory() as directory:
+			path = os.path.join(directory, 'oneMax.checkpoint')
+			genetic.get_best(get_fitness, 100, 100, [0, 1], lambda candidate: None, poolSize = 20,
+							generational = genetic.Generational(offspring = 5), maxGenerations = 50,
+							checkpoint = path, checkpointSeconds = 0)
+			with open(path, mode = 'rb') as infile:
+				self.assertEqual(len(pickle.load(infile)['parents']), 20)
+
+	# crossover between clones fails, and _crossover then replaces the donor with a random individual,
+	# which must not take the elite's place
+	def test_generational_keeps_elite(self):
+		with tempfile.TemporaryDirectory() as directory:
+			path = os.path.join(directory, 'oneMax.checkpoint')
+			best = genetic.get_best(get_fitness, 100, 100, [0, 1], lambda candidate: None, poolSize = 10,
+									crossover = lambda parentGenes, donorGenes: None, seed = 1,
+									generational = genetic.Generational(), maxGenerations = 1000,
+									checkpoint = path, checkpointSeconds = 0)
+			with open(path, mode = 'rb') as infile:
+				parents = pickle.load(infile)['parents']
+		self.assertEqual(max(get_fitness(genes) for genes, _, _ in parents), best.Fitness)
+
+	def test_mu_plus_lambda(self):
+		self.test_generational(genetic.Generational(replacement = genetic.Replacement.MuPlusLambda))
+
+	def test_measure_diversity(self):
+		parents = [genetic.Chromosome(genes, get_fitness(genes), genetic.Strategies.Create)
+				for genes in [[0, 0, 0, 0], [0, 0, 0, 0], [1, 1, 0, 0]]]
+		diversity = genetic.measure_diversity(parents)
+		self.assertEqual(diversity.UniqueGenomes, 2)
+		self.assertAlmostEqual(diversity.MeanHammingDistance, 4 / 3)
+
+	def test_unique_parents(self):
+		best = genetic.get_best(get_fitness, 100, 100, [0, 1], lambda candidate: None, poolSize = 10, maxAge = 20,
+								uniqueParents = True)
+		self.assertEqual(best.Fitness, 100)
+
+	def test_annealing_history(self):
+		annealing = genetic.Annealing(maxHistory = 4)
+		annealing.start([0])
+		for fitness in range(1, 10):
+			annealing.improved(fitness)
+		self.assertLessEqual(len(annealing.History), 4)
+		self.assertEqual(annealing.History, sorted(annealing.History))
+		self.assertEqual(annealing.History[-1], 9)
+
+	def test_mutate_in_place(self):
+		copied = genetic.iterate_best(get_fitness, 500, 500, [0, 1], seed = 1)
+		inPlace = genetic.iterate_best(get_fitness, 500, 500, [0, 1], seed = 1, mutateInPlace = True)
+		for expected, actual in zip(copied, inPlace):
+			self.assertEqual(expected.Generation, actual.Generation)
+			self.assertEqual(expected.Chromosome.Genes, actual.Chromosome.Genes)
+
+	def test_max_generations(self):
+		improvements = list(genetic.iterate_best(get_fitness, 1000, 1000, [0, 1], maxGenerations = 100))
+		self.assertTrue(improvements[-1].TimedOut)
+		self.assertEqual(improvements[-1].Generation, 100)
+
+	def test_max_evaluations(self):
+		improvements = list(genetic.iterate_best(get_fitness, 1000, 1000, [0, 1], maxEvaluations = 100))
+		self.assertTrue(improvements[-1].TimedOut)
+		self.assertEqual(improvements[-1].Evaluations, 100)
+
+	def test_max_stall_generations(self):
+		# nothing ever improves on the first parent
+		improvements = list(genetic.iterate_best(lambda genes: 0, 100, 1, [0, 1], maxStallGenerations = 500))
+		self.assertTrue(improvements[-1].TimedOut)
+		self.assertEqual(improvements[-1].Generation, 500)
+
+	def test_benchmark_result(self):
+		result = genetic.BenchmarkResult([5, 1, 4, 2, 3], [10, 20, 30, 40, 50], [1, 2, 3, 4, 5])
+		self.assertEqual((result.Median, result.Min, result.GenerationsToSolution), (3, 1, 30))
+		self.assertAlmostEqual(result.P95, 4.8)
+		self.assertEqual(result.EvaluationsPerSecond, 1)
+
+	def test_benchmark_harness(self):
+		def fnRun():
+			genetic.get_best(get_fitness, 30, 30, [0, 1], lambda candidate: None)
+
+		with tempfile.TemporaryDirectory() as directory:
+			output = os.path.join(directory, 'result.json')
+			fast = os.path.join(directory, 'fast.json')
+			slow = os.path.join(directory, 'slow.json')
+			genetic.BenchmarkResult([1e-9], [1], [1]).save(fast)
+			genetic.BenchmarkResult([1e9], [1], [1]).save(slow)
+
+			result = genetic.Benchmark.run(fnRun, iterations = 3, seed = 5, output = output, baseline = fast)
+			self.assertTrue(result.Regressed)
+			with open(output) as infile:
+				saved = json.load(infile)
+			self.assertEqual(len(saved['timings']), 3)
+			self.assertEqual(saved['median'], result.Median)
+			for field in ['p95', 'min', 'generationsToSolution', 'evaluationsPerSecond', 'generations', 'evaluations']:
+				self.assertIn(field, saved)
+			self.assertEqual(genetic.BenchmarkResult.load(output).Timings, result.Timings)
+			self.assertGreater(min(result.Generations), 0)
+			self.assertGreater(min(result.Evaluations), 0)
+
+			again = genetic.Benchmark.run(fnRun, iterations = 3, seed = 5, baseline = slow)
+			self.assertFalse(again.Regressed)
+			self.assertEqual(again.Generations, result.Generations)
+
+		cutOff = genetic.Benchmark.run(lambda: time.sleep(0.02), iterations = 100, warmUp = 0, maxSeconds = 0.05)
+		self.assertLess(len(cutOff.Timings), 100)
+
 	def test_benchmark(self):
 		genetic.Benchmark.run(lambda: self.test(4000))
 
+	def test_benchmark_in_place(self):
+		genetic.Benchmark.run(lambda: self.test(4000, mutateInPlace = True))
+
 if __name__ == '__main__':
 	unittest.main()
\ No newline at end of file
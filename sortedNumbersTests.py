@@ -7,6 +7,37 @@ class SortedNumbersTests(unittest.TestCase):
 	def test_sort_10_numbers(self):
 		self.sort_numbers(10)
 
+	def test_scheduler(self, workers = None):
+		geneset = [i for i in range(100)]
+		scheduler = genetic.Scheduler(workers = workers)
+		for totalNumbers in range(5, 25):
+			scheduler.submit(genetic.Problem(get_fitness, totalNumbers, Fitness(totalNumbers, 0), geneset,
+											name = totalNumbers))
+		results = scheduler.run()
+		print(scheduler)
+		for result in results:
+			self.assertTrue(result.Solved, result.Problem.Name)
+
+	def test_scheduler_workers(self):
+		self.test_scheduler(workers = 2)
+
+	def test_scheduler_workers_error(self):
+		def fnGetFitness(genes):
+			raise ValueError('no fitness')
+
+		geneset = [i for i in range(100)]
+		scheduler = genetic.Scheduler(workers = 2)
+		scheduler.submit(genetic.Problem(get_fitness, 5, Fitness(5, 0), geneset))
+		scheduler.submit(genetic.Problem(fnGetFitness, 5, Fitness(5, 0), geneset))
+		with self.assertRaisesRegex(ValueError, 'no fitness'):
+			scheduler.run()
+
+	def test_fitness_ordering(self):
+		fitnesses = [Fitness(5, 2), Fitness(3, 0), Fitness(5, 1)]
+		self.assertEqual([str(f) for f in sorted(fitnesses)], [str(f) for f in [fitnesses[1], fitnesses[0], fitnesses[2]]])
+		self.assertTrue(Fitness(3, 0) < Fitness(5, 2) <= Fitness(5, 2))
+		self.assertIs(max(fitnesses), fitnesses[2])
+
 	def test_benchmark(self):
 		genetic.Benchmark.run(lambda: self.sort_numbers(40))
 
@@ -26,9 +57,8 @@ class SortedNumbersTests(unittest.TestCase):
 		self.assertTrue(not optimalFitness > best.Fitness)
 
 
-class Fitness:
-	NumbersInSequenceCount = None
-	TotalGap = None
+class Fitness(genetic.FitnessValue):
+	__slots__ = ('NumbersInSequenceCount', 'TotalGap')
 
 	def __init__(self, numbersInSequenceCount, totalGap):
 		self.NumbersInSequenceCount = numbersInSequenceCount
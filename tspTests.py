@@ -1,55 +1,237 @@
+import heapq
+import json
+import mmap
+import os
 import random
+import struct
+import tempfile
 import unittest
 import genetic
 import math
 
-from itertools import chain
+from array import array
+from collections import deque
+from itertools import chain, islice
+from operator import getitem
 from datetime import datetime as dt
 
+# cities on the squares of a solution to the 8 queens puzzle, the optimal tour visits them in order
+EIGHT_QUEENS = {
+	'A': [4, 7],
+	'B': [2, 6],
+	'C': [0, 5],
+	'D': [1, 3],
+	'E': [3, 0],
+	'F': [5, 1],
+	'G': [7, 2],
+	'H': [6, 4]
+}
+EIGHT_QUEENS_OPTIMAL_SEQUENCE = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H']
+
 class TravelingSalesmanTests(unittest.TestCase):
 
 	def test_ulysses16(self):
-		idToLocationLookup = load_data('ulysses16.tsp')
+		problem = load_tsplib('ulysses16.tsp')
 		optimalSequence = [14, 13, 12, 16, 1, 3, 2, 4, 8, 15, 5, 11, 9, 10, 7, 6]
-		self.solve(idToLocationLookup, optimalSequence)
+		self.solve(list(problem.Ids), problem.distance_matrix(), optimalSequence)
 
 	def test_8_queens(self):
-		idToLocationLookup = {
-			'A': [4, 7],
-			'B': [2, 6],
-			'C': [0, 5],
-			'D': [1, 3],
-			'E': [3, 0],
-			'F': [5, 1],
-			'G': [7, 2],
-			'H': [6, 4]
+		self.solve_8_queens()
+
+	def test_8_queens_instrumented(self):
+		with tempfile.TemporaryDirectory() as directory:
+			sampleFile = os.path.join(directory, 'samples.jsonl')
+			instrumentation = genetic.Instrumentation(sampleFile, sampleInterval = 1)
+			self.solve_8_queens(instrumentation, seed = 1)
+			with open(sampleFile) as infile:
+				samples = [json.loads(line) for line in infile]
+		print(instrumentation)
+		self.assertGreater(instrumentation.Generations, 0)
+		self.assertEqual(sum(instrumentation.Children.values()), instrumentation.Generations)
+		self.assertGreater(instrumentation.Children[genetic.Strategies.Mutate], 0)
+		self.assertGreater(instrumentation.CallbackCalls['get_fitness'], 0)
+		self.assertGreater(instrumentation.Improvements, 0)
+		# one per generation and a last one when the run stops
+		self.assertEqual(len(samples), instrumentation.Generations + 1)
+		self.assertEqual(samples[-1]['generations'], instrumentation.Generations)
+
+	def test_8_queens_seeded(self):
+		first = self.solve_8_queens(seed = 3)
+		second = self.solve_8_queens(seed = 3)
+		self.assertEqual(first.Genes, second.Genes)
+
+	def test_8_queens_strategy_selector(self):
+		strategySelector = genetic.StrategySelector()
+		self.solve_8_queens(seed = 1, strategySelector = strategySelector)
+		print(strategySelector)
+		self.assertGreater(strategySelector.Trials[genetic.Strategies.Crossover], 0)
+
+	def test_8_queens_generational(self):
+		self.solve_8_queens(generational = genetic.Generational())
+
+	def test_8_queens_unique_parents(self):
+		instrumentation = genetic.Instrumentation(sampleInterval = 10)
+		self.solve_8_queens(instrumentation, seed = 2, uniqueParents = True)
+		print(instrumentation)
+		self.assertIsNotNone(instrumentation.Diversity)
+
+	def test_8_queens_temperature_annealing(self):
+		annealing = genetic.Annealing(genetic.AnnealingSchedule.Temperature, maxHistory = 8)
+		self.solve_8_queens(seed = 3, annealing = annealing)
+		self.assertLessEqual(len(annealing.History), 8)
+
+	def test_tour_deltas(self):
+		rng = random.Random(1)
+		idToLocationLookup = {id: [rng.uniform(0, 100), rng.uniform(0, 100)] for id in range(30)}
+		_, matrix = build_distance_matrix(idToLocationLookup)
+		for length in [4, 5, 30]:
+			tour = rng.sample(range(30), length)
+			for i in range(length):
+				for j in range(length):
+					swapped = tour[:]
+					swapped[i], swapped[j] = swapped[j], swapped[i]
+					self.assertAlmostEqual(tour_length(swapped, matrix),
+										tour_length(tour, matrix) + swap_delta(tour, i, j, matrix))
+					if i <= j:
+						reversedTour = tour[:i] + tour[i:j + 1][::-1] + tour[j + 1:]
+						self.assertAlmostEqual(tour_length(reversedTour, matrix),
+											tour_length(tour, matrix) + reversal_delta(tour, i, j, matrix))
+
+	def test_8_queens_local_search(self):
+		self.solve_8_queens(seed = 1, localSearch = True)
+
+	def test_local_search(self):
+		rng = random.Random(1)
+		idToLocationLookup = {id: [rng.uniform(0, 100), rng.uniform(0, 100)] for id in range(200)}
+		_, matrix = build_distance_matrix(idToLocationLookup)
+		neighbours = nearest_neighbours(matrix, 8)
+		tour = rng.sample(range(200), 200)
+		initialLength = tour_length(tour, matrix)
+		changedIndexes = set()
+		delta = local_search(tour, matrix, neighbours, changedIndexes = changedIndexes)
+		self.assertEqual(sorted(tour), list(range(200)))
+		self.assertAlmostEqual(tour_length(tour, matrix), initialLength + delta)
+		self.assertLess(tour_length(tour, matrix), initialLength / 4)
+		self.assertGreater(len(changedIndexes), 0)
+
+	def test_benchmark_crossover(self):
+		for cityCount in [100, 1000, 5000]:
+			rng = random.Random(cityCount)
+			parentGenes = rng.sample(range(cityCount), cityCount)
+			donorGenes = parentGenes[:]
+			for _ in range(cityCount // 10):
+				indexA, indexB = rng.sample(range(cityCount), 2)
+				donorGenes[indexA], donorGenes[indexB] = donorGenes[indexB], donorGenes[indexA]
+			noImprovement = Fitness(0)
+
+			def fnGetFitness(genes):
+				return noImprovement
+
+			print(f'{cityCount} cities')
+			genetic.Benchmark.run(lambda: crossover(parentGenes, donorGenes, fnGetFitness, rng), iterations = 200,
+								maxSeconds = 20)
+
+	def test_load_tsplib(self):
+		files = {
+			'euc.tsp': 'NAME: euc\nTYPE : TSP\nDIMENSION: 3\nEDGE_WEIGHT_TYPE : EUC_2D\nNODE_COORD_SECTION\n'
+					'1\t0 0\n\n 2 3.0 4.0 1.0\n3 6e0 8\nEOF\n',
+			'att.tsp': 'NAME : att\nDIMENSION : 2\nEDGE_WEIGHT_TYPE : ATT\nNODE_COORD_SECTION\n1 6734 1453\n2 2233 10\n',
+			'geo.tsp': 'NAME : geo\nDIMENSION : 2\nEDGE_WEIGHT_TYPE : GEO\nDISPLAY_DATA_TYPE : COORD_DISPLAY\n'
+					'NODE_COORD_SECTION\n 1 38.24 20.42\n 2 39.57 26.15\nEOF\n',
+			'explicit.tsp': 'NAME: explicit\nDIMENSION: 4\nEDGE_WEIGHT_TYPE: EXPLICIT\nEDGE_WEIGHT_FORMAT: UPPER_ROW\n'
+					'EDGE_WEIGHT_SECTION\n 1 2\n 3\n 4 5\n 6\nDISPLAY_DATA_SECTION\n1 0 0\n2 1 0\n3 1 1\n4 0 1\nEOF\n'
 		}
-		optimalSequence = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H']
-		self.solve(idToLocationLookup, optimalSequence)
+		with tempfile.TemporaryDirectory() as directory:
+			for fileName, content in files.items():
+				with open(os.path.join(directory, fileName), mode = 'w') as outfile:
+					outfile.write(content)
+			euc = load_tsplib(os.path.join(directory, 'euc.tsp'))
+			self.assertEqual(list(euc.Ids), [1, 2, 3])
+			self.assertEqual(euc.distance_matrix()[0], [0, 5, 10])
+			self.assertEqual(load_data(os.path.join(directory, 'euc.tsp'))[2], [3.0, 4.0])
+			self.assertEqual(load_tsplib(os.path.join(directory, 'att.tsp')).distance(0, 1), 1495)
+			self.assertEqual(load_tsplib(os.path.join(directory, 'geo.tsp')).distance(0, 1), 509)
+			for fileName, content in [
+					('atsp.tsp', 'TYPE: ATSP\nDIMENSION: 2\nEDGE_WEIGHT_TYPE: EXPLICIT\nEDGE_WEIGHT_FORMAT: FULL_MATRIX\n'
+								'EDGE_WEIGHT_SECTION\n0 1\n1 0\n'),
+					('asymmetric.tsp', 'DIMENSION: 3\nEDGE_WEIGHT_TYPE: EXPLICIT\nEDGE_WEIGHT_FORMAT: FULL_MATRIX\n'
+									'EDGE_WEIGHT_SECTION\n0 1 2\n9 0 3\n2 3 0\n'),
+					('truncated.tsp', 'DIMENSION: 3\nEDGE_WEIGHT_TYPE: EUC_2D\nNODE_COORD_SECTION\n1 0 0\n2 3 4\n')]:
+				with open(os.path.join(directory, fileName), mode = 'w') as outfile:
+					outfile.write(content)
+				with self.assertRaises(ValueError):
+					load_tsplib(os.path.join(directory, fileName))
+			explicit = load_tsplib(os.path.join(directory, 'explicit.tsp'))
+			self.assertEqual([list(row) for row in explicit.distance_matrix()],
+							[[0, 1, 2, 3], [1, 0, 4, 5], [2, 4, 0, 6], [3, 5, 6, 0]])
+
+			cacheFileName = os.path.join(directory, 'euc.cache')
+			load_tsplib(os.path.join(directory, 'euc.tsp'), cacheFileName)
+			cached = load_tsplib(os.path.join(directory, 'euc.tsp'), cacheFileName)
+			self.assertIsInstance(cached.Weights, memoryview)
+			self.assertEqual((cached.Name, cached.EdgeWeightType, list(cached.Ids)), ('euc', 'EUC_2D', [1, 2, 3]))
+			self.assertEqual(list(cached.X), list(euc.X))
+			self.assertEqual(tour_length([2, 0, 1], cached.distance_matrix()), 20)
+			del cached # unmaps the cache before the directory is removed
+
+	def test_8_queens_explicit(self):
+		_, matrix = build_distance_matrix(EIGHT_QUEENS)
+		with tempfile.TemporaryDirectory() as directory:
+			fileName = os.path.join(directory, 'queens.tsp')
+			with open(fileName, mode = 'w') as outfile:
+				outfile.write('NAME: queens\nTYPE: TSP\nDIMENSION: 8\nEDGE_WEIGHT_TYPE: EXPLICIT\n'
+							'EDGE_WEIGHT_FORMAT: FULL_MATRIX\nEDGE_WEIGHT_SECTION\n')
+				for row in matrix:
+					outfile.write(' '.join(map(repr, row)) + '\n')
+				outfile.write('EOF\n')
+			cacheFileName = os.path.join(directory, 'queens.cache')
+			load_tsplib(fileName, cacheFileName)
+			problem = load_tsplib(fileName, cacheFileName)
+			self.solve(list(problem.Ids), problem.distance_matrix(), [1, 2, 3, 4, 5, 6, 7, 8], seed = 1)
+			del problem # unmaps the cache before the directory is removed
 
-	def solve(self, idToLocationLookup, optimalSequence):
-		geneset = [i for i in idToLocationLookup.keys()]
+	# solves the EIGHT_QUEENS tour, any other arguments are passed on to solve
+	def solve_8_queens(self, *args, **kwargs):
+		return self.solve(*build_distance_matrix(EIGHT_QUEENS), EIGHT_QUEENS_OPTIMAL_SEQUENCE, *args, **kwargs)
+
+	# ids[i] is the id of city i, matrix[i][j] the distance between cities i and j, see
+	# build_distance_matrix and TspProblem.distance_matrix
+	def solve(self, ids, matrix, optimalSequence, instrumentation = None, seed = None,
+			strategySelector = None, generational = None, uniqueParents = False, annealing = None,
+			localSearch = False):
+		neighbours = nearest_neighbours(matrix, 8) if localSearch else None
+		indexOf = {id: index for index, id in enumerate(ids)}
+		geneset = [i for i in range(len(ids))]
+		rng = genetic.get_random(seed)
 
 		def fnCreate():
-			return random.sample(geneset, len(geneset))
+			return rng.sample(geneset, len(geneset))
 
 		def fnDisplay(candidate):
-			display(candidate, startTime)
+			display(candidate, startTime, ids)
 
 		def fnGetFitness(genes):
-			return get_fitness(genes, idToLocationLookup)
+			return get_fitness(genes, matrix)
 
 		def fnMutate(genes):
-			mutate(genes, fnGetFitness)
+			if localSearch:
+				return local_search_mutate(genes, matrix, neighbours, rng)
+			return mutate(genes, matrix, rng)
+
+		def fnFitnessDelta(parentGenes, parentFitness, changedIndexes, genes):
+			return get_fitness_delta(parentGenes, parentFitness, changedIndexes, genes, matrix)
 
 		def fnCrossover(parent, donor):
-			return crossover(parent, donor, fnGetFitness)
+			return crossover(parent, donor, fnGetFitness, rng)
 
-		optimalFitness = fnGetFitness(optimalSequence)
+		optimalFitness = fnGetFitness([indexOf[id] for id in optimalSequence])
 		startTime = dt.now()
 		best = genetic.get_best(fnGetFitness, None, optimalFitness, None, fnDisplay, 
-			fnMutate, fnCreate, maxAge = 500, poolSize = 25, crossover = fnCrossover)
+			fnMutate, fnCreate, maxAge = 500, poolSize = 25, crossover = fnCrossover, fitness_delta = fnFitnessDelta,
+			instrumentation = instrumentation, seed = rng, strategySelector = strategySelector,
+			generational = generational, uniqueParents = uniqueParents, annealing = annealing)
 		self.assertTrue(not optimalFitness > best.Fitness)
+		return best
 
 def get_distance(locationA, locationB):
 	sideA = locationA[0] - locationB[0]
@@ -57,11 +239,55 @@ def get_distance(locationA, locationB):
 	sideC = math.sqrt(sideA ** 2 + sideB ** 2)
 	return sideC
 
-class Fitness:
-	TotalDistance = None
+# Distances between every pair of cities, as a list of rows so that a tour of city indexes is
+# measured with list lookups only. ids[i] is the id of the city at index i.
+def build_distance_matrix(idToLocationLookup):
+	ids = [id for id in idToLocationLookup.keys()]
+	locations = [idToLocationLookup[id] for id in ids]
+	matrix = [[get_distance(locationA, locationB) for locationB in locations] for locationA in locations]
+	return ids, matrix
+
+# Length of the closed tour, summing matrix[tour[i]][tour[i + 1]] without a Python-level loop
+def tour_length(tour, matrix):
+	return matrix[tour[-1]][tour[0]] + sum(map(getitem, map(matrix.__getitem__, tour), islice(tour, 1, None)))
+
+# Change in tour length from swapping the cities at indexes i and j, from the (at most four)
+# edges around them. Like the rest of this module it expects a symmetric matrix.
+def swap_delta(tour, i, j, matrix):
+	length = len(tour)
+	if length < 4 or i == j:
+		return 0
+	if i > j:
+		i, j = j, i
+	a, b = tour[i], tour[j]
+	if j - i == 1:
+		before, after = tour[i - 1], tour[(j + 1) % length]
+		return matrix[before][b] + matrix[a][after] - matrix[before][a] - matrix[b][after]
+	if i == 0 and j == length - 1:
+		before, after = tour[j - 1], tour[1]
+		return matrix[before][a] + matrix[b][after] - matrix[before][b] - matrix[a][after]
+	beforeA, afterA = tour[i - 1], tour[i + 1]
+	beforeB, afterB = tour[j - 1], tour[(j + 1) % length]
+	rowA, rowB = matrix[a], matrix[b]
+	return rowB[beforeA] + rowB[afterA] + rowA[beforeB] + rowA[afterB] - \
+		rowA[beforeA] - rowA[afterA] - rowB[beforeB] - rowB[afterB]
+
+# Change in tour length from reversing tour[i:j + 1], only the two edges at its ends change
+def reversal_delta(tour, i, j, matrix):
+	length = len(tour)
+	if i > j:
+		i, j = j, i
+	if j - i + 1 >= length - 1:
+		return 0
+	before, first, last, after = tour[i - 1], tour[i], tour[j], tour[(j + 1) % length]
+	return matrix[before][last] + matrix[first][after] - matrix[before][first] - matrix[last][after]
+
+class Fitness(genetic.FitnessValue):
+	__slots__ = ('TotalDistance', 'UnroundedDistance')
 
 	def __init__(self, totalDistance):
 		self.TotalDistance = totalDistance
+		self.UnroundedDistance = None # used by get_fitness_delta so rounding errors do not accumulate
 
 	def __gt__(self, other):
 		return self.TotalDistance < other.TotalDistance
@@ -69,67 +295,448 @@ class Fitness:
 	def __str__(self):
 		return f'{self.TotalDistance:0.2f}'
 
-def get_fitness(genes, idToLocationLookup):
-	fitness = get_distance(idToLocationLookup[genes[0]], idToLocationLookup[genes[-1]])
+def get_fitness(genes, matrix):
+	return get_fitness_from_distance(tour_length(genes, matrix))
+
+def get_fitness_from_distance(totalDistance):
+	fitness = Fitness(round(totalDistance, 2))
+	fitness.UnroundedDistance = totalDistance
+	return fitness
+
+# Only the edges leaving a changed index (the one before it and the one after it in the tour) can
+# change length, so adjust the parent's tour length by those edges instead of walking the tour
+def get_fitness_delta(parentGenes, parentFitness, changedIndexes, genes, matrix):
+	edgeIndexes = set()
+	for index in changedIndexes:
+		edgeIndexes.add(index - 1 if index > 0 else len(genes) - 1)
+		edgeIndexes.add(index)
 
-	for i in range(len(genes) - 1):
-		start = idToLocationLookup[genes[i]]
-		end = idToLocationLookup[genes[i + 1]]
-		fitness += get_distance(start, end)
+	def edge_length(tour, index):
+		return matrix[tour[index]][tour[(index + 1) % len(tour)]]
 
-	return Fitness(round(fitness, 2))
+	totalDistance = parentFitness.UnroundedDistance
+	for index in edgeIndexes:
+		totalDistance += edge_length(genes, index) - edge_length(parentGenes, index)
+	return get_fitness_from_distance(totalDistance)
 
-def display(candidate, startTime):
+def display(candidate, startTime, ids):
 	timeDiff = dt.now() - startTime
-	print(f'{" ".join(map(str, candidate.Genes))}\t{candidate.Fitness}\t{candidate.Strategy.name}\t{str(timeDiff)}')
+	print(f'{" ".join(str(ids[index]) for index in candidate.Genes)}\t{candidate.Fitness}\t{candidate.Strategy.name}\t{str(timeDiff)}')
 
 
-def mutate(genes, fnGetFitness):
-	count = random.randint(2, len(genes))
-	initialFitness = fnGetFitness(genes)
+# Swaps random pairs of cities until the tour is shorter, keeping track of the change in length
+# with swap_delta instead of measuring the tour after every swap
+def mutate(genes, matrix, rng = random):
+	count = rng.randint(2, len(genes))
+	delta = 0
+	changedIndexes = set()
 	while count > 0:
 		count -= 1
-		indexA, indexB = random.sample(range(len(genes)), 2)
+		indexA, indexB = rng.sample(range(len(genes)), 2)
+		delta += swap_delta(genes, indexA, indexB, matrix)
 		genes[indexA], genes[indexB] = genes[indexB], genes[indexA]
-		fitness = fnGetFitness(genes)
-		if fitness > initialFitness:
-			return
+		changedIndexes.update((indexA, indexB))
+		if delta < 0:
+			break
+	return changedIndexes
+
+# mutate, then a local search around the cities it moved
+def local_search_mutate(genes, matrix, neighbours, rng = random):
+	changedIndexes = mutate(genes, matrix, rng)
+	local_search(genes, matrix, neighbours, [genes[index] for index in changedIndexes], changedIndexes)
+	return changedIndexes
+
+# The count nearest cities to every city, nearest first
+def nearest_neighbours(matrix, count):
+	cities = range(len(matrix))
+	neighbours = []
+	for city in cities:
+		nearest = heapq.nsmallest(count + 1, cities, key = matrix[city].__getitem__)
+		neighbours.append([c for c in nearest if c != city][:count])
+	return neighbours
+
+_EPSILON = 1e-9 # smallest change in length that counts as an improvement
+
+# Improves the tour in place with 2-opt and Or-opt moves until neither finds one, and returns the
+# change in its length. Only moves that make an edge from a city to one of its neighbours are
+# tried, and a city is only looked at again once one of its edges changes (don't-look bits), so
+# with cities only those and the cities the moves reach are searched. The indexes of the tour
+# that changed are added to changedIndexes.
+def local_search(tour, matrix, neighbours, cities = None, changedIndexes = None):
+	if changedIndexes is None:
+		changedIndexes = set()
+	if len(tour) < 5:
+		return 0
+	positions = [0] * len(matrix)
+	for index, city in enumerate(tour):
+		positions[city] = index
+	queue = deque(tour if cities is None else cities)
+	queued = [False] * len(matrix)
+	for city in queue:
+		queued[city] = True
+	totalDelta = 0
+	while queue:
+		city = queue.popleft()
+		queued[city] = False
+		delta, touched = _two_opt(city, tour, positions, matrix, neighbours, changedIndexes)
+		if touched is None:
+			delta, touched = _or_opt(city, tour, positions, matrix, neighbours, changedIndexes)
+			if touched is None:
+				continue
+		totalDelta += delta
+		for c in touched:
+			if not queued[c]:
+				queued[c] = True
+				queue.append(c)
+	return totalDelta
+
+# Replaces the edge from city to the next (or previous) city and the matching edge of one of its
+# neighbours with the edge between them and the edge between the cities they were joined to
+def _two_opt(city, tour, positions, matrix, neighbours, changedIndexes):
+	length = len(tour)
+	index = positions[city]
+	row = matrix[city]
+	for forward in (True, False):
+		other = tour[(index + 1) % length] if forward else tour[index - 1]
+		removed = row[other]
+		for c in neighbours[city]:
+			if row[c] >= removed:
+				break
+			cIndex = positions[c]
+			cOther = tour[(cIndex + 1) % length] if forward else tour[cIndex - 1]
+			if c == other or cOther == city:
+				continue
+			delta = row[c] + matrix[other][cOther] - removed - matrix[c][cOther]
+			if delta < -_EPSILON:
+				if forward:
+					start, count = (index + 1) % length, (cIndex - index) % length
+				else:
+					start, count = cIndex, (index - cIndex) % length
+				if count * 2 > length: # reversing the rest of the tour gives the same tour
+					start, count = (start + count) % length, length - count
+				_reverse(tour, positions, start, count, changedIndexes)
+				return delta, (city, other, c, cOther)
+	return 0, None
 
+# Moves the run of 1 to 3 cities starting at city, forwards or backwards, between one of the
+# neighbours of its ends and the city before or after that neighbour
+def _or_opt(city, tour, positions, matrix, neighbours, changedIndexes):
+	length = len(tour)
+	index = positions[city]
+	for segmentLength in (1, 2, 3):
+		if length - segmentLength < 3:
+			break
+		first, last = city, tour[(index + segmentLength - 1) % length]
+		before, after = tour[index - 1], tour[(index + segmentLength) % length]
+		removed = matrix[before][first] + matrix[last][after] - matrix[before][after]
+		if removed <= _EPSILON:
+			continue
+		for end in ((first,) if segmentLength == 1 else (first, last)):
+			row = matrix[end]
+			for c in neighbours[end]:
+				if row[c] >= removed:
+					break
+				cIndex = positions[c]
+				if (cIndex - index) % length < segmentLength:
+					continue
+				for x, y in ((c, tour[(cIndex + 1) % length]), (tour[cIndex - 1], c)):
+					if (positions[x] - index) % length < segmentLength or (positions[y] - index) % length < segmentLength:
+						continue
+					added = matrix[x][first] + matrix[last][y]
+					addedReversed = matrix[x][last] + matrix[first][y]
+					delta = min(added, addedReversed) - matrix[x][y] - removed
+					if delta < -_EPSILON:
+						_move_segment(tour, positions, index, segmentLength, positions[x], addedReversed < added,
+									changedIndexes)
+						return delta, (before, after, first, last, x, y)
+	return 0, None
+
+# Reverses count cities of the tour from index start on, wrapping around its end
+def _reverse(tour, positions, start, count, changedIndexes):
+	length = len(tour)
+	i, j = start, (start + count - 1) % length
+	for _ in range(count // 2):
+		cityI, cityJ = tour[i], tour[j]
+		tour[i], tour[j] = cityJ, cityI
+		positions[cityJ], positions[cityI] = i, j
+		changedIndexes.add(i)
+		changedIndexes.add(j)
+		i = i + 1 if i + 1 < length else 0
+		j = j - 1 if j > 0 else length - 1
+
+# Moves the count cities from index start on to just after index target, shifting the cities in
+# between along whichever way round the tour is shorter
+def _move_segment(tour, positions, start, count, target, reverse, changedIndexes):
+	length = len(tour)
+	segment = [tour[(start + offset) % length] for offset in range(count)]
+	if reverse:
+		segment.reverse()
+	forwardCount = (target - start - count) % length + 1
+	backwardCount = length - count - forwardCount
+	if forwardCount <= backwardCount:
+		offsets = range(forwardCount)
+		source, shift = start + count, -count
+		segmentStart = (start + forwardCount) % length
+	else:
+		offsets = range(backwardCount - 1, -1, -1)
+		source, shift = target + 1, count
+		segmentStart = (target + 1) % length
+	for offset in offsets:
+		city = tour[(source + offset) % length]
+		index = (source + offset + shift) % length
+		tour[index] = city
+		positions[city] = index
+		changedIndexes.add(index)
+	for offset, city in enumerate(segment):
+		index = (segmentStart + offset) % length
+		tour[index] = city
+		positions[city] = index
+		changedIndexes.add(index)
+
+# {id: [x, y]} for the cities of a TSPLIB file with coordinates. To solve a problem by its own
+# EDGE_WEIGHT_TYPE, or one that only has an EXPLICIT matrix, use load_tsplib(...).distance_matrix().
 def load_data(localFileName):
-	""" expects:
-		HEADER section before DATA section, all lines start in column 0
-		DATA section element all have space in column 0
-		<space>1 23.45 67.89
-		last line of file is: " EOF"
-	"""
+	return load_tsplib(localFileName).locations()
+
+# A TSPLIB problem. Ids, X and Y are contiguous arrays in file order (X and Y are empty when the
+# file only has an EXPLICIT matrix). Weights is the flat Dimension x Dimension distance matrix
+# when the file gives one or it was loaded from a cache that has one, otherwise distances are
+# computed from the coordinates as EdgeWeightType says.
+class TspProblem:
+	Name = None
+	EdgeWeightType = None
+	Dimension = 0
+	Ids = None
+	X = None
+	Y = None
+	Weights = None
+
+	def __init__(self, name, edgeWeightType, ids, x, y, weights = None):
+		self.Name = name
+		self.EdgeWeightType = edgeWeightType
+		self.Dimension = len(ids)
+		self.Ids = ids
+		self.X = x
+		self.Y = y
+		self.Weights = weights
+
+	# distance between the cities at indexes indexA and indexB
+	def distance(self, indexA, indexB):
+		if self.Weights is not None:
+			return self.Weights[indexA * self.Dimension + indexB]
+		distance, x, y = self._metric()
+		return distance(x[indexA], y[indexA], x[indexB], y[indexB]) if indexA != indexB else 0
+
+	# Rows of distances by city index, as used by get_fitness and local_search. Rows of a cached
+	# matrix are slices of the memory-mapped file, not copies.
+	def distance_matrix(self):
+		dimension = self.Dimension
+		if self.Weights is not None:
+			weights = self.Weights
+			return [weights[i * dimension:(i + 1) * dimension] for i in range(dimension)]
+		distance, x, y = self._metric()
+		matrix = []
+		for i in range(dimension):
+			xI, yI = x[i], y[i]
+			row = [distance(xI, yI, xJ, yJ) for xJ, yJ in zip(x, y)]
+			row[i] = 0
+			matrix.append(row)
+		return matrix
+
+	def _metric(self):
+		if self.EdgeWeightType not in _DISTANCES:
+			raise ValueError(f'unsupported EDGE_WEIGHT_TYPE {self.EdgeWeightType}')
+		if self.EdgeWeightType == 'GEO':
+			return _geo, [_geo_radians(c) for c in self.X], [_geo_radians(c) for c in self.Y]
+		return _DISTANCES[self.EdgeWeightType], self.X, self.Y
+
+	def locations(self):
+		return {id: [x, y] for id, x, y in zip(self.Ids, self.X, self.Y)}
+
+# TSPLIB distance functions, rounded as the TSPLIB documentation specifies
+def _euc_2d(xA, yA, xB, yB):
+	return int(math.hypot(xA - xB, yA - yB) + 0.5)
+
+def _ceil_2d(xA, yA, xB, yB):
+	return math.ceil(math.hypot(xA - xB, yA - yB))
+
+def _att(xA, yA, xB, yB):
+	distance = math.sqrt(((xA - xB) ** 2 + (yA - yB) ** 2) / 10.0)
+	rounded = int(distance + 0.5)
+	return rounded + 1 if rounded < distance else rounded
+
+# GEO coordinates are DDD.MM (degrees and minutes), PI is truncated as in the TSPLIB code
+def _geo_radians(coordinate):
+	degrees = int(coordinate)
+	return 3.141592 * (degrees + 5.0 * (coordinate - degrees) / 3.0) / 180.0
+
+def _geo(latitudeA, longitudeA, latitudeB, longitudeB):
+	q1 = math.cos(longitudeA - longitudeB)
+	q2 = math.cos(latitudeA - latitudeB)
+	q3 = math.cos(latitudeA + latitudeB)
+	return int(6378.388 * math.acos(min(1.0, 0.5 * ((1.0 + q1) * q2 - (1.0 - q1) * q3))) + 1.0)
 
+_DISTANCES = {'EUC_2D': _euc_2d, 'CEIL_2D': _ceil_2d, 'ATT': _att, 'GEO': _geo}
+
+# Order in which each EDGE_WEIGHT_FORMAT lists the (row, column) entries of the matrix; the
+# column-wise formats list the same entries as their row-wise transposes
+_EDGE_WEIGHT_FORMATS = {
+	'FULL_MATRIX': lambda n: ((i, j) for i in range(n) for j in range(n)),
+	'UPPER_ROW': lambda n: ((i, j) for i in range(n) for j in range(i + 1, n)),
+	'LOWER_ROW': lambda n: ((i, j) for i in range(n) for j in range(i)),
+	'UPPER_DIAG_ROW': lambda n: ((i, j) for i in range(n) for j in range(i, n)),
+	'LOWER_DIAG_ROW': lambda n: ((i, j) for i in range(n) for j in range(i + 1))
+}
+_EDGE_WEIGHT_FORMATS['UPPER_COL'] = _EDGE_WEIGHT_FORMATS['LOWER_ROW']
+_EDGE_WEIGHT_FORMATS['LOWER_COL'] = _EDGE_WEIGHT_FORMATS['UPPER_ROW']
+_EDGE_WEIGHT_FORMATS['UPPER_DIAG_COL'] = _EDGE_WEIGHT_FORMATS['LOWER_DIAG_ROW']
+_EDGE_WEIGHT_FORMATS['LOWER_DIAG_COL'] = _EDGE_WEIGHT_FORMATS['UPPER_DIAG_ROW']
+
+# Reads a TSPLIB file a line at a time, keeping the coordinates in arrays rather than a list per
+# city. With a cacheFileName, the problem is saved there (see save_tsplib_cache) and later loads
+# map that file instead of parsing the TSPLIB file again, until the TSPLIB file is newer.
+def load_tsplib(localFileName, cacheFileName = None, cacheDistances = True):
+	if cacheFileName is not None and os.path.exists(cacheFileName) and \
+			os.path.getmtime(cacheFileName) >= os.path.getmtime(localFileName):
+		return load_tsplib_cache(cacheFileName)
+	header = {}
+	ids = array('q')
+	x = array('d')
+	y = array('d')
+	weights = None
 	with open(localFileName, mode = 'r') as infile:
-		content = infile.read().splitlines()
-	idToLocationLookup = {}
-	for row in content:
-		if row[0] != ' ': #HEADERS
+		for line in infile:
+			keyword, _, value = line.partition(':')
+			keyword = keyword.strip()
+			if keyword == 'EOF':
+				break
+			if keyword == '':
+				continue
+			if keyword == 'NODE_COORD_SECTION':
+				_read_coordinates(infile, int(header['DIMENSION']), ids, x, y)
+			elif keyword == 'EDGE_WEIGHT_SECTION':
+				weights = _read_edge_weights(infile, int(header['DIMENSION']),
+											header.get('EDGE_WEIGHT_FORMAT', 'FULL_MATRIX'))
+			elif keyword == 'DISPLAY_DATA_SECTION':
+				_read_coordinates(infile, int(header['DIMENSION']), array('q'), array('d'), array('d'))
+			elif keyword.endswith('_SECTION'):
+				raise ValueError(f'unsupported section {keyword} in {localFileName}')
+			else:
+				header[keyword] = value.strip()
+	if header.get('TYPE', 'TSP').split()[0] != 'TSP':
+		raise ValueError(f'unsupported TYPE {header["TYPE"]} in {localFileName}, only symmetric TSP problems are')
+	if len(ids) == 0:
+		ids = array('q', range(1, int(header['DIMENSION']) + 1))
+	problem = TspProblem(header.get('NAME'), header.get('EDGE_WEIGHT_TYPE'), ids, x, y, weights)
+	if cacheFileName is not None:
+		save_tsplib_cache(problem, cacheFileName, cacheDistances)
+	return problem
+
+def _read_coordinates(infile, dimension, ids, x, y):
+	while len(ids) < dimension:
+		line = next(infile, None)
+		if line is None:
+			raise ValueError(f'section ended after {len(ids)} of {dimension} nodes')
+		fields = line.split()
+		if len(fields) == 0:
 			continue
-		if row == ' EOF':
-			break
+		ids.append(int(fields[0]))
+		x.append(float(fields[1]))
+		y.append(float(fields[2]))
+
+def _read_edge_weights(infile, dimension, edgeWeightFormat):
+	if edgeWeightFormat not in _EDGE_WEIGHT_FORMATS:
+		raise ValueError(f'unsupported EDGE_WEIGHT_FORMAT {edgeWeightFormat}')
+	weights = array('d', bytes(8 * dimension * dimension))
+	fields = (field for line in infile for field in line.split())
+	fullMatrix = edgeWeightFormat == 'FULL_MATRIX'
+	for i, j in _EDGE_WEIGHT_FORMATS[edgeWeightFormat](dimension):
+		field = next(fields, None)
+		if field is None:
+			raise ValueError('EDGE_WEIGHT_SECTION ended early')
+		weights[i * dimension + j] = float(field)
+		if not fullMatrix:
+			weights[j * dimension + i] = weights[i * dimension + j]
+	if fullMatrix:
+		for i in range(dimension):
+			for j in range(i + 1, dimension):
+				if weights[i * dimension + j] != weights[j * dimension + i]:
+					raise ValueError(f'FULL_MATRIX is not symmetric, row {i + 1} column {j + 1}')
+	return weights
+
+# Binary cache of a TspProblem: this header, then the ids, the x and the y coordinates and,
+# optionally, the full distance matrix, all 8 bytes per value in this machine's byte order
+_CACHE_HEADER = struct.Struct('<4sI32s32sqq')
+_CACHE_MAGIC = b'TSPC'
+_CACHE_VERSION = 1
+_CACHE_COORDINATES = 1
+_CACHE_WEIGHTS = 2
+
+# With distances, the distance matrix is stored as well, n * n * 8 bytes, so that loading the
+# cache does not have to compute it
+def save_tsplib_cache(problem, cacheFileName, distances = True):
+	weights = problem.Weights
+	if weights is None and distances:
+		weights = array('d', chain.from_iterable(problem.distance_matrix()))
+	flags = (_CACHE_COORDINATES if len(problem.X) > 0 else 0) | (_CACHE_WEIGHTS if weights is not None else 0)
+	with open(cacheFileName, mode = 'wb') as outfile:
+		outfile.write(_CACHE_HEADER.pack(_CACHE_MAGIC, _CACHE_VERSION, (problem.Name or '').encode()[:32],
+										(problem.EdgeWeightType or '').encode()[:32], problem.Dimension, flags))
+		outfile.write(problem.Ids)
+		if flags & _CACHE_COORDINATES:
+			outfile.write(problem.X)
+			outfile.write(problem.Y)
+		if weights is not None:
+			outfile.write(weights)
 
-		id, x, y = row.split(' ')[1:4]
-		idToLocationLookup[int(id)] = [float(x), float(y)]
-	return idToLocationLookup
+# Maps a cache written by save_tsplib_cache; the arrays of the problem are views of the mapped file
+def load_tsplib_cache(cacheFileName):
+	with open(cacheFileName, mode = 'rb') as infile:
+		mapped = mmap.mmap(infile.fileno(), 0, access = mmap.ACCESS_READ)
+	magic, version, name, edgeWeightType, dimension, flags = _CACHE_HEADER.unpack_from(mapped)
+	if magic != _CACHE_MAGIC or version != _CACHE_VERSION:
+		raise ValueError(f'{cacheFileName} is not a TSPLIB cache')
+	view = memoryview(mapped)
 
-def crossover(parentGenes, donorGenes, fnGetFitness):
-	pairs = {Pair(donorGenes[0], donorGenes[-1]): 0}
+	def fnRead(offset, count, typecode):
+		return view[offset:offset + 8 * count].cast(typecode), offset + 8 * count
 
-	for i in range(len(donorGenes) - 1):
-		pairs[Pair(donorGenes[i], donorGenes[i+1])] = 0
+	ids, offset = fnRead(_CACHE_HEADER.size, dimension, 'q')
+	x, y = array('d'), array('d')
+	if flags & _CACHE_COORDINATES:
+		x, offset = fnRead(offset, dimension, 'd')
+		y, offset = fnRead(offset, dimension, 'd')
+	weights = None
+	if flags & _CACHE_WEIGHTS:
+		weights, offset = fnRead(offset, dimension * dimension, 'd')
+	return TspProblem(name.rstrip(b'\0').decode() or None, edgeWeightType.rstrip(b'\0').decode() or None, ids, x, y,
+					weights)
+
+# The city after and the city before every city in a tour of the cities 0 to len(genes) - 1, so
+# that whether two cities are adjacent in it is two list lookups
+def build_edge_index(genes):
+	nextCity = [0] * len(genes)
+	previousCity = [0] * len(genes)
+	previous = genes[-1]
+	for city in genes:
+		nextCity[previous] = city
+		previousCity[city] = previous
+		previous = city
+	return nextCity, previousCity
+
+def crossover(parentGenes, donorGenes, fnGetFitness, rng = random):
+	nextCity, previousCity = build_edge_index(donorGenes)
 	# make sure first and last genes in parentGenes are not adjacent in donorGenes
 	# if they are, search for a pari of adjecent points from parentGenes that are not 
 	# adjacent in donorGenes. If one is found, then shift the discontinuity to the beg
 	# of the array so we know no runs wrap around the end of the array
 	tempGenes = parentGenes[:]
-	if Pair(parentGenes[0], parentGenes[-1]) in pairs:
+	first, last = parentGenes[0], parentGenes[-1]
+	if nextCity[first] == last or previousCity[first] == last:
 		found = False
 		for i in range(len(parentGenes) - 1):
-			if Pair(parentGenes[i], parentGenes[i + 1]) in pairs:
+			city, adjacent = parentGenes[i], parentGenes[i + 1]
+			if nextCity[city] == adjacent or previousCity[city] == adjacent:
 				continue
 			tempGenes = parentGenes[i + 1:] + parentGenes[:i + 1]
 			found = True
@@ -140,45 +747,33 @@ def crossover(parentGenes, donorGenes, fnGetFitness):
 	# The lookup table helps to find them regardless of the direction the parent's genes 
 	# are cycling
 	runs = [[tempGenes[0]]]
-	for i in range(len(tempGenes) - 1):
-		if Pair(tempGenes[i], tempGenes[i+1]) in pairs:
-			runs[-1].append(tempGenes[i+1])
-			continue
-		runs.append([tempGenes[i+1]])
+	run = runs[0]
+	previous = tempGenes[0]
+	for city in islice(tempGenes, 1, None):
+		if nextCity[previous] == city or previousCity[previous] == city:
+			run.append(city)
+		else:
+			run = [city]
+			runs.append(run)
+		previous = city
 	# tryo to find a reordering of the runs that has a better fitness than the current parent.
 	# do this by swapping any pairs of runs and checking the fitness with a 
 	# chance of reversing the order
 	initialFitness = fnGetFitness(parentGenes)
-	count = random.randint(2, 20)
+	count = rng.randint(2, 20)
 	runIndexes = range(len(runs))
 	while count > 0:
 		count -= 1
 		for i in runIndexes:
 			if len(runs[i]) == 1:
 				continue
-			if random.randint(0, len(runs)) == 0:
+			if rng.randint(0, len(runs)) == 0:
 				runs[i] = [n for n in reversed(runs[i])]
 		# if fitness is better than parent, return new genetic sequence. otherwise repeat until
 		# an imporvement is found or complete maximum number of attempts (then give up and return what exists)
-		indexA, indexB = random.sample(runIndexes, 2)
+		indexA, indexB = rng.sample(runIndexes, 2)
 		runs[indexA], runs[indexB] = runs[indexB], runs[indexA]
 		childGenes = list(chain.from_iterable(runs))
 		if fnGetFitness(childGenes) > initialFitness:
 			return childGenes
-	return childGenes
-
-class Pair:
-	Node = None
-	Adjacent = None
-
-	def __init__(self, node, adjacent):
-		if node < adjacent:
-			node, adjacent = adjacent, node
-		self.Node = node
-		self.Adjacent = adjacent
-
-	def __eq__(self, other):
-		return self.Node == other.Node and self.Adjacent == other.Adjacent
-
-	def __hash__(self):
-		return hash(self.Node) * 397 ^ hash(self.Adjacent)
\ No newline at end of file
+	return childGenes
\ No newline at end of file